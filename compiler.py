@@ -7,12 +7,17 @@
 
 
 import argparse
+import multiprocessing
 import os
 import subprocess
+import sys
+import traceback
+from itertools import chain
 
 from gnuradio import gr
 
-from .core import Messages
+from .core import Constants, Messages
+from .core.manifest import BuildManifest, file_hash
 from .core.platform import Platform
 
 
@@ -26,21 +31,156 @@ def argument_parser():
                         help="Output to default hier_block library (overwrites -o)")
     parser.add_argument("-r", "--run", action="store_true", default=False,
                         help="Run the program after compiling [default=%(default)s]")
+    parser.add_argument("-j", "--jobs", metavar='N', type=int, default=1,
+                        help="Compile the files in N parallel processes, "
+                             "0 for one per CPU [default=%(default)s]")
+    parser.add_argument("-f", "--force", action="store_true", default=False,
+                        help="Generate the files even if their inputs are unchanged "
+                             "[default=%(default)s]")
     parser.add_argument(metavar="GRC_FILE", dest='grc_files', nargs='+',
                         help=".grc file to compile")
     return parser
 
 
-def main(args=None):
-    args = args or argument_parser().parse_args()
-
-    platform = Platform(
+def make_platform():
+    return Platform(
         name='GNU Radio Companion Compiler',
         prefs=gr.prefs(),
         version=gr.version(),
-        version_parts=(gr.major_version(), gr.api_version(), gr.minor_version())
+        version_parts=(gr.major_version(), gr.api_version(), gr.minor_version()),
+        headless=True,
     )
+
+
+def get_run_command(platform, flow_graph, grc_file, file_path):
+    if flow_graph is None:  # generation was skipped, load the flow graph
+        flow_graph = platform.make_flow_graph(grc_file)
+        flow_graph.rewrite()
+    return flow_graph.get_run_command(file_path, split=True)
+
+
+# shared with the worker processes of compile_batch()
+_worker_platform = None
+_worker_output_dir = None
+_worker_manifest = None
+
+
+def _init_worker(output_dir, manifest, generated_hier_blocks, platform=None):
+    global _worker_platform, _worker_output_dir, _worker_manifest
+    if platform is None:  # not forked, load the library again
+        platform = make_platform()
+        platform.build_library()
+        platform.generated_hier_blocks = dict(generated_hier_blocks)
+    _worker_platform = platform
+    _worker_output_dir = output_dir
+    _worker_manifest = manifest
+
+
+def _compile_in_worker(task):
+    """
+    Generate a flow graph (or hier block), returns the generated file,
+    run command, messages, build manifest entry and the generated files
+    (None if it was up to date)
+    """
+    grc_file, hier_only = task
+    messages = []
+    Messages.MESSENGERS_LIST[:] = [messages.append]
+    file_path = run_command = manifest_entry = generated_files = None
+    try:
+        if hier_only:
+            _, file_path = _worker_platform.load_and_generate_flow_graph(
+                grc_file, hier_only=True)
+        else:
+            flow_graph, file_path = _worker_platform.load_and_generate_flow_graph(
+                grc_file, _worker_output_dir, manifest=_worker_manifest)
+            if flow_graph and file_path:
+                run_command = flow_graph.get_run_command(file_path, split=True)
+                generated_files = flow_graph.generated_files
+            if _worker_manifest:
+                manifest_entry = _worker_manifest.get_entry(grc_file, _worker_output_dir)
+    except Exception:
+        messages.append(traceback.format_exc())
+    return file_path, run_command, ''.join(messages), manifest_entry, generated_files
+
+
+def _used_block_ids(platform, grc_files):
+    block_ids = set()
+    for grc_file in grc_files:
+        try:
+            data = platform.parse_flow_graph(grc_file, quiet=True)
+        except Exception:
+            continue  # reported when the flow graph is loaded
+        block_ids.update(block_data['id'] for block_data in data.get('blocks', []))
+    return block_ids
+
+
+def compile_batch(platform, grc_files, output_dir, jobs, manifest=None):
+    """
+    Generate several flow graphs in a pool of worker processes.
+
+    The library of the platform is shared with the workers (if processes can
+    be forked). The messages of each file are sent in the order of grc_files.
+
+    The hier blocks the flow graphs depend on are generated first, each one
+    once and in dependency order (independent ones in parallel).
+
+    Args:
+        platform: a platform with a built library
+        grc_files: the (absolute) paths of the flow graphs
+        output_dir: the output directory
+        jobs: max number of worker processes
+        manifest: a build manifest to skip unchanged flow graphs (updated)
+
+    Returns:
+        a list of (grc file, generated file or None, run command, generated files)
+        tuples, the generated files (file path -> replaced) are None if the
+        flow graph was up to date
+    """
+    fork = 'fork' in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if fork else None)
+    jobs = jobs or os.cpu_count() or 1
+
+    def run(files, hier_only=False):
+        # a new pool for each run, so forked workers know all generated hier blocks
+        init_args = (output_dir, manifest, platform.generated_hier_blocks)
+        if fork:
+            init_args += (platform,)
+        sys.stdout.flush()  # don't inherit buffered output
+        with context.Pool(min(jobs, len(files)), initializer=_init_worker,
+                          initargs=init_args) as pool:
+            tasks = [(grc_file, hier_only) for grc_file in files]
+            for grc_file, result in zip(files, pool.imap(_compile_in_worker, tasks)):
+                Messages.send('\n')
+                Messages.send(result[2])
+                yield grc_file, result
+
+    outdated = [grc_file for grc_file in grc_files if not (
+        manifest and manifest.get_up_to_date_output(
+            grc_file, output_dir, platform.get_block_source, platform.get_generator_inputs()))]
+    if platform.generated_hier_blocks is None:
+        platform.generated_hier_blocks = {}
+    layers = platform.hier_block_build_order(outdated)
+    if outdated:  # compile the templates once, instead of in every worker
+        platform.precompile_templates(_used_block_ids(platform, chain(outdated, *layers)))
+    for layer in layers:
+        for grc_file, (file_path, _, _, _, _) in run(layer, hier_only=True):
+            if file_path:
+                platform.generated_hier_blocks[grc_file, file_hash(grc_file)] = file_path
+
+    results = []
+    for grc_file, (file_path, run_command, _, manifest_entry, generated_files) in run(grc_files):
+        results.append((grc_file, file_path, run_command, generated_files))
+        if manifest and manifest_entry:
+            manifest.set_entry(grc_file, output_dir, manifest_entry)
+    return results
+
+
+def main(args=None):
+    args = args or argument_parser().parse_args()
+
+    platform = make_platform()
     platform.build_library()
+    platform.generated_hier_blocks = {}  # for this run only
 
     output_dir = args.output if not args.user_lib_dir else platform.config.hier_block_lib_dir
     try:
@@ -50,15 +190,61 @@ def main(args=None):
         exit(str(e))
 
     Messages.send_init(platform)
-    flow_graph = file_path = None
+    manifest = BuildManifest(Constants.BUILD_MANIFEST_FILE, platform.config.version)
+    manifest.load()
+    if getattr(args, 'force', False):
+        for grc_file in args.grc_files:
+            manifest.discard(os.path.abspath(grc_file), os.path.abspath(output_dir))
+
+    try:
+        if getattr(args, 'jobs', 1) != 1:
+            return main_batch(args, platform, output_dir, manifest)
+
+        flow_graph = file_path = None
+        for grc_file in args.grc_files:
+            os.path.exists(grc_file) or exit('Error: missing ' + grc_file)
+            Messages.send('\n')
+
+            flow_graph, file_path = platform.load_and_generate_flow_graph(
+                os.path.abspath(grc_file), os.path.abspath(output_dir), manifest=manifest)
+            if not file_path:
+                exit('Compilation error')
+    finally:
+        manifest.save()
+    if file_path and args.run:
+        run_command_args = get_run_command(
+            platform, flow_graph, os.path.abspath(args.grc_files[-1]), file_path)
+        subprocess.call(run_command_args)
+
+
+def main_batch(args, platform, output_dir, manifest=None):
     for grc_file in args.grc_files:
         os.path.exists(grc_file) or exit('Error: missing ' + grc_file)
-        Messages.send('\n')
 
-        flow_graph, file_path = platform.load_and_generate_flow_graph(
-            os.path.abspath(grc_file), os.path.abspath(output_dir))
+    results = compile_batch(
+        platform, [os.path.abspath(grc_file) for grc_file in args.grc_files],
+        os.path.abspath(output_dir), args.jobs, manifest
+    )
+
+    failed = [grc_file for grc_file, file_path, _, _ in results if not file_path]
+    Messages.send('\n>>> Generated {} of {} flow graphs\n'.format(
+        len(results) - len(failed), len(results)))
+    for grc_file, file_path, _, generated_files in results:
         if not file_path:
-            exit('Compilation error')
+            Messages.send('    FAILED  {}\n'.format(grc_file))
+        elif generated_files is None:
+            Messages.send('    OK      {} -> {} (up to date)\n'.format(grc_file, file_path))
+        else:
+            Messages.send('    OK      {} -> {} ({} of {} files changed)\n'.format(
+                grc_file, file_path, sum(generated_files.values()), len(generated_files)))
+            for output_file, changed in generated_files.items():
+                Messages.send('            {} {}\n'.format(
+                    'changed  ' if changed else 'unchanged', output_file))
+    if failed:
+        exit('Compilation error ({} failed)'.format(len(failed)))
+
+    grc_file, file_path, run_command_args, _ = results[-1]
     if file_path and args.run:
-        run_command_args = flow_graph.get_run_command(file_path, split=True)
+        run_command_args = run_command_args or get_run_command(
+            platform, None, grc_file, file_path)
         subprocess.call(run_command_args)
@@ -47,6 +47,16 @@ class Config(object):
 
         return valid_paths
 
+    @property
+    def block_load_processes(self):
+        """Number of processes used to parse block descriptions (<= 1: no pool)"""
+        return self._gr_prefs.get_long('grc', 'block_load_processes', 0)
+
+    @property
+    def docstring_extraction_workers(self):
+        """Number of worker processes used to extract block docstrings"""
+        return self._gr_prefs.get_long('grc', 'docstring_extraction_workers', 1)
+
     @property
     def default_flow_graph(self):
         user_default = (
@@ -7,6 +7,8 @@ SPDX-License-Identifier: GPL-2.0-or-later
 """
 
 
+from collections.abc import MutableSet
+
 from .base import Element
 from .Constants import ALIASES_OF
 from .utils.descriptors import lazy_property
@@ -117,3 +119,67 @@ class Connection(Element):
             self.source_block.name, self.source_port.key,
             self.sink_block.name, self.sink_port.key
         )
+
+
+class ConnectionSet(MutableSet):
+    """
+    The connections of a flow graph, indexed by port and by block
+    """
+
+    def __init__(self, connections=()):
+        self._connections = {}  # connection -> connection (the one stored)
+        self._by_port = {}
+        self._by_block = {}
+        self.version = 0  # incremented on every change
+        for connection in connections:
+            self.add(connection)
+
+    def of_port(self, port):
+        """Get the connections to/from a port (don't modify)"""
+        return self._by_port.get(port, ())
+
+    def of_block(self, block):
+        """Get the connections to/from a block (don't modify)"""
+        return self._by_block.get(block, ())
+
+    def _index(self, connection):
+        for port in connection:
+            yield self._by_port, port
+            yield self._by_block, port.parent_block
+
+    def add(self, connection):
+        if connection in self._connections:
+            return
+        self._connections[connection] = connection
+        self.version += 1
+        for index, key in self._index(connection):
+            index.setdefault(key, {})[connection] = None
+
+    def discard(self, connection):
+        connection = self._connections.pop(connection, None)
+        if connection is None:
+            return
+        self.version += 1
+        for index, key in self._index(connection):
+            connections = index[key]
+            del connections[connection]
+            if not connections:
+                del index[key]
+
+    def clear(self):
+        self.version += 1
+        self._connections.clear()
+        self._by_port.clear()
+        self._by_block.clear()
+
+    def __contains__(self, connection):
+        return connection in self._connections
+
+    def __iter__(self):
+        return iter(self._connections)
+
+    def __len__(self):
+        return len(self._connections)
+
+    def __repr__(self):
+        return 'ConnectionSet({!r})'.format(list(self._connections))
@@ -21,7 +21,11 @@ BLOCK_DTD = os.path.join(DATA_DIR, 'block.dtd')
 DEFAULT_FLOW_GRAPH = os.path.join(DATA_DIR, 'default_flow_graph.grc')
 DEFAULT_HIER_BLOCK_LIB_DIR = os.path.expanduser('~/.grc_gnuradio')
 
-CACHE_FILE = os.path.expanduser('~/.cache/grc_gnuradio/cache_v2.json')
+CACHE_FILE = os.path.expanduser('~/.cache/grc_gnuradio/cache_v3.bin')
+LIBRARY_SNAPSHOT_FILE = os.path.expanduser('~/.cache/grc_gnuradio/library_v1.pickle')
+DOCSTRING_CACHE_FILE = os.path.expanduser('~/.cache/grc_gnuradio/docstrings_v1.json')
+BUILD_MANIFEST_FILE = os.path.expanduser('~/.cache/grc_gnuradio/build_manifest.json')
+TEMPLATE_MODULE_DIR = os.path.expanduser('~/.cache/grc_gnuradio/mako_modules_v1')
 
 BLOCK_DESCRIPTION_FILE_FORMAT_VERSION = 1
 # File format versions:
@@ -14,14 +14,88 @@ import logging
 from operator import methodcaller, attrgetter
 
 from . import Messages, blocks
+from .Connection import ConnectionSet
 from .Constants import FLOW_GRAPH_FILE_FORMAT_VERSION
 from .base import Element
-from .utils import expr_utils
+from .ports._virtual_connections import VirtualPortTable
+from .utils import expr_utils, import_cache
 from .utils.backports import shlex
 
 log = logging.getLogger(__name__)
 
 
+_MISSING = object()
+
+# max number of expressions in the evaluation cache of a flow graph
+EVAL_CACHE_SIZE = 10000
+
+
+# types of values an expression result may be cached for (see FlowGraph.evaluate)
+_IMMUTABLE_TYPES = (int, float, complex, str, bytes, type(None))
+# builtins whose results don't only depend on their arguments
+_IMPURE_BUILTINS = {'__import__', 'eval', 'exec', 'globals', 'locals', 'vars', 'id',
+                    'input', 'open', 'iter', 'next', 'print'}
+
+
+def _is_immutable(value):
+    if isinstance(value, (tuple, frozenset)):
+        return all(_is_immutable(item) for item in value)
+    return isinstance(value, _IMMUTABLE_TYPES)
+
+
+def _same_value(a, b):
+    """Check if a cached namespace value is still the current one"""
+    if a is b:
+        return True
+    if type(a) is not type(b):
+        return False
+    try:
+        return (a == b) is True  # objects like arrays don't compare to a bool
+    except Exception:
+        return False
+
+
+# blocks that change the namespace or other blocks, a change rewrites the whole flow graph
+_FULL_REWRITE_KEYS = {'options', 'import', 'snippet', 'parameter', 'epy_module', 'epy_block'}
+# param types checked against the params of other blocks (e.g. gui hint collisions)
+_CROSS_BLOCK_DTYPES = {'gui_hint', 'id', 'stream_id'}
+# the block states used by a rewrite (not the coordinates and rotation in the GUI)
+_REWRITE_STATES = ('state', 'bus_source', 'bus_sink', 'bus_structure')
+
+
+class _BlockRewriteState(object):
+    """Parameters and namespace inputs of a block at the last rewrite"""
+
+    __slots__ = ('signature', 'imports', 'dependencies')
+
+    def __init__(self, block, imports):
+        self.signature = _block_signature(block)
+        self.imports = imports
+        self.dependencies = None  # variable names used in the params, see _depends_on()
+
+
+def _block_signature(block):
+    states = {key: block.states.get(key) for key in _REWRITE_STATES}
+    return states, [(key, param.value) for key, param in block.params.items()]
+
+
+def _used_names(values):
+    """Get the names used in param values (or the words of values that are no expression)"""
+    names = set()
+    for value in values:
+        try:
+            names.update(expr_utils.dependencies(value))
+        except Exception:
+            # e.g. a gui hint like "tab@0: row, 0", which refers to blocks and variables
+            names.update(expr_utils._expr_split(value))
+    return names
+
+
+def _ports_signature(block):
+    return [(port.key, port.domain, port.dtype, port.vlen, port.hidden, port.optional)
+            for port in block.ports()]
+
+
 class FlowGraph(Element):
 
     is_flow_graph = True
@@ -37,16 +111,24 @@ class FlowGraph(Element):
             the flow graph object
         """
         Element.__init__(self, parent)
+        self._blocks_by_name = {}  # name -> list of blocks
         self.options_block = self.parent_platform.make_block(self, 'options')
 
-        self.blocks = [self.options_block]
-        self.connections = set()
+        self.blocks = []
+        self._add_block(self.options_block)
+        self.connections = ConnectionSet()
 
         self._eval_cache = {}
         self.namespace = {}
         self.imported_names = []
 
+        self._block_rewrite_states = None  # block -> _BlockRewriteState
+        self._rewrite_connections = set()
+        self._sorted_variables = []
+        self._virtual_port_table = None
+
         self.grc_file_path = ''
+        self.generated_files = {}  # file path -> replaced (new contents), of the last generation
 
     def __str__(self):
         return 'FlowGraph - {}({})'.format(self.get_option('title'), self.get_option('id'))
@@ -191,6 +273,19 @@ class FlowGraph(Element):
         except Exception as e:
             raise ValueError("Can't parse run command {!r}: {}".format(run_command, e))
 
+    def get_virtual_port_table(self):
+        """
+        Get the virtual sinks/sources by stream id and the memoized resolution
+        of virtual connections. Built once per rewrite (or connection change).
+
+        Returns:
+            a VirtualPortTable
+        """
+        table = self._virtual_port_table
+        if table is None or table.connections_version != self.connections.version:
+            table = self._virtual_port_table = VirtualPortTable(self)
+        return table
+
     def get_imported_names(self):
         """
         Get a lis of imported names.
@@ -205,10 +300,53 @@ class FlowGraph(Element):
     # Access Elements
     ##############################################
     def get_block(self, name):
-        for block in self.blocks:
-            if block.name == name:
-                return block
-        raise KeyError('No block with name {!r}'.format(name))
+        try:
+            return self._blocks_by_name[name][0]
+        except KeyError:
+            raise KeyError('No block with name {!r}'.format(name))
+
+    def get_block_names(self):
+        """
+        Get the names of all blocks (enabled or not).
+
+        Returns:
+            a set-like view of block names
+        """
+        return self._blocks_by_name.keys()
+
+    def count_enabled_blocks(self, name):
+        """
+        Count the enabled blocks with a name.
+
+        Args:
+            name: the block name
+
+        Returns:
+            the number of enabled blocks with this name
+        """
+        return sum(1 for block in self._blocks_by_name.get(name, ()) if block.enabled)
+
+    def block_name_changed(self, block, old_name):
+        """Update the name index of blocks after a block was renamed"""
+        same_name = self._blocks_by_name.get(old_name, [])
+        if block not in same_name:
+            return  # not (yet) in this flow graph
+        self._remove_block_name(block, old_name)
+        self._blocks_by_name.setdefault(block.name, []).append(block)
+
+    def _add_block(self, block):
+        self.blocks.append(block)
+        self._blocks_by_name.setdefault(block.name, []).append(block)
+
+    def _remove_block(self, block):
+        self.blocks.remove(block)
+        self._remove_block_name(block, block.name)
+
+    def _remove_block_name(self, block, name):
+        same_name = self._blocks_by_name[name]
+        same_name.remove(block)
+        if not same_name:
+            del self._blocks_by_name[name]
 
     def get_elements(self):
         elements = list(self.blocks)
@@ -221,20 +359,160 @@ class FlowGraph(Element):
     def rewrite(self):
         """
         Flag the namespace to be renewed.
+
+        If only params of (plain) blocks changed since the last rewrite, just
+        these blocks, the variables depending on them and the blocks using
+        variables whose value changed are rewritten. If only connections
+        changed, all blocks are rewritten, but the namespace is kept.
+        Otherwise the namespace is renewed and all blocks are rewritten.
         """
-        self.renew_namespace()
+        self._virtual_port_table = None
+        if self._rewrite_changed_blocks():
+            return
+        block_imports = self.renew_namespace()
         Element.rewrite(self)
 
+        self._block_rewrite_states = {
+            block: _BlockRewriteState(block, block_imports.get(block)) for block in self.blocks}
+        self._rewrite_connections = set(self.connections)
+
+    def validate(self):
+        """
+        Validate the changed elements (see Element.validate) and the params
+        whose checks depend on other blocks (like unique ids).
+        """
+        Element.validate(self)
+        for block in self.blocks:
+            for param in block.params.values():
+                if param.dtype in _CROSS_BLOCK_DTYPES:
+                    param.validate()
+
+    def _rewrite_changed_blocks(self):
+        """
+        Rewrite the blocks affected by the changes since the last rewrite
+
+        Returns:
+            False if the whole flow graph has to be rewritten
+        """
+        states = self._block_rewrite_states
+        if states is None or len(states) != len(self.blocks):
+            return False
+        connections = set(self.connections)
+
+        changed = set()
+        for block in self.blocks:
+            state = states.get(block)
+            if state is None:
+                return False  # added block
+            signature = _block_signature(block)
+            if signature == state.signature:
+                continue
+            (block_states, params), (old_block_states, old_params) = signature, state.signature
+            if (block.key in _FULL_REWRITE_KEYS or block.is_dummy_block or
+                    block.is_virtual_or_pad or block_states != old_block_states or
+                    block.name != dict(old_params).get('id')):
+                return False  # new state/name, changed modules, virtual streams, ...
+            if any(block.params[key].dtype in _CROSS_BLOCK_DTYPES
+                   for (key, value), (_, old_value) in zip(params, old_params) if value != old_value):
+                return False  # checked against other blocks
+            if block.is_variable and _used_names(value for _, value in params) != \
+                    _used_names(value for _, value in old_params):
+                return False  # the order of variables may change
+            if block.enabled and block.templates.render('imports') != state.imports:
+                return False
+            state.signature = signature
+            state.dependencies = None
+            changed.add(block)
+
+        if connections != self._rewrite_connections:
+            if changed:
+                return False
+            # the namespace doesn't depend on connections, just rewrite the elements
+            Element.rewrite(self)
+            for block in self.blocks:
+                states[block].signature = _block_signature(block)
+            self._rewrite_connections = set(self.connections)
+            return True
+
+        del self._error_messages[:]
+        # other blocks may refer to a changed block by name (e.g. tabs in gui hints)
+        changed_names = {block.name for block in changed if not block.is_variable}
+        rewritten = set()
+
+        def rewrite_block(block):
+            ports = _ports_signature(block)
+            block.rewrite()
+            rewritten.add(block)
+            return _ports_signature(block) == ports
+
+        # re-evaluate the affected variables in order of dependency (like renew_namespace)
+        for variable_block in self._sorted_variables:
+            if variable_block not in changed and not self._depends_on(variable_block, changed_names):
+                continue
+            name = variable_block.name
+            try:
+                if not rewrite_block(variable_block):
+                    return False
+                value = expr_utils.evaluate(variable_block.value, self.namespace, variable_block.namespace)
+            except Exception as error:
+                if not isinstance(error, TypeError):
+                    log.exception('Failed to evaluate variable block {0}'.format(name), exc_info=True)
+                value = _MISSING
+            if not _same_value(self.namespace.get(name, _MISSING), value):
+                changed_names.add(name)
+                if value is _MISSING:
+                    del self.namespace[name]
+                else:
+                    self.namespace[name] = value
+
+        for block in self.blocks:
+            if block in rewritten:
+                continue
+            if block in changed or self._depends_on(block, changed_names):
+                if not rewrite_block(block):
+                    return False  # port types may be inherited by other blocks
+
+        for connection in {c for block in rewritten for c in self.connections.of_block(block)}:
+            connection.rewrite()
+        self._rewrite_connections = set(self.connections)
+        return True
+
+    def _depends_on(self, block, names=None):
+        """
+        Get the names used in the param values of a block (cached until the next change)
+
+        Args:
+            block: a block of this flow graph
+            names: a set of names to check for
+
+        Returns:
+            the set of used names or whether any of the given names is used
+        """
+        if names is not None and not names:
+            return False
+        state = self._block_rewrite_states[block]
+        if state.dependencies is None:
+            state.dependencies = _used_names(param.value for param in block.params.values())
+        return state.dependencies if names is None else not state.dependencies.isdisjoint(names)
+
     def renew_namespace(self):
+        """
+        Renew the namespace: run the imports and evaluate parameters and variables
+
+        Returns:
+            a dict of enabled block -> rendered imports
+        """
         namespace = {}
         # Before renewing the namespace, clear it
         # to get rid of entries of blocks that
         # are no longer valid ( deleted, disabled, ...)
         self.namespace.clear()
         # Load imports
-        for expr in self.imports():
+        block_imports = {block: block.templates.render('imports')
+                         for block in self.iter_enabled_blocks()}
+        for expr in block_imports.values():
             try:
-                exec(expr, namespace)
+                import_cache.exec_imports(expr, namespace)
             except ImportError:
                 # We do not have a good way right now to determine if an import is for a
                 # hier block, these imports will fail as they are not in the search path
@@ -259,7 +537,7 @@ class FlowGraph(Element):
         np = {}  # params don't know each other
         for parameter_block in self.get_parameters():
             try:
-                value = eval(parameter_block.params['value'].to_code(), namespace)
+                value = expr_utils.evaluate(parameter_block.params['value'].to_code(), namespace)
                 np[parameter_block.name] = value
             except Exception:
                 log.exception('Failed to evaluate parameter block {0}'.format(parameter_block.name), exc_info=True)
@@ -270,10 +548,11 @@ class FlowGraph(Element):
         # otherwise sometimes variable_block rewrite / eval fails
         self.namespace.update(namespace)
         # Load variables
-        for variable_block in self.get_variables():
+        self._sorted_variables = self.get_variables()
+        for variable_block in self._sorted_variables:
             try:
                 variable_block.rewrite()
-                value = eval(variable_block.value, namespace, variable_block.namespace)
+                value = expr_utils.evaluate(variable_block.value, namespace, variable_block.namespace)
                 namespace[variable_block.name] = value
                 self.namespace.update(namespace) # rewrite on subsequent blocks depends on an updated self.namespace 
             except TypeError: #Type Errors may happen, but that doesn't matter as they are displayed in the gui
@@ -281,20 +560,50 @@ class FlowGraph(Element):
             except Exception:
                 log.exception('Failed to evaluate variable block {0}'.format(variable_block.name), exc_info=True)
                 pass
-
-        self._eval_cache.clear()
+        return block_imports
 
     def evaluate(self, expr, namespace=None, local_namespace=None):
         """
         Evaluate the expression.
+
+        Expressions evaluated in the flow graph namespace are cached together
+        with the values of the names they use, if these values and the result
+        are immutable (numbers, strings and tuples of them). A cached result
+        is reused as long as none of these values changed. Errors are not
+        cached.
         """
         # Evaluate
         if not expr:
             raise Exception('Cannot evaluate empty statement.')
         if namespace is not None:
-            return eval(expr, namespace, local_namespace)
+            return expr_utils.evaluate(expr, namespace, local_namespace)
+        if local_namespace is not None or not isinstance(expr, str):
+            return expr_utils.evaluate(expr, self.namespace, local_namespace)
+
+        namespace = self.namespace
+        entry = self._eval_cache.get(expr)
+        if entry is not None:
+            code, inputs, result = entry
+            if all(_same_value(namespace.get(name, _MISSING), value) for name, value in inputs):
+                return result
+            names = tuple(name for name, _ in inputs)
+        else:
+            try:
+                code, names = expr_utils.compile_expr(expr)
+            except SyntaxError:
+                code, names = None, ()
+        inputs = tuple((name, namespace.get(name, _MISSING)) for name in names)
+
+        result = eval(code if code is not None else expr, namespace)
+        if code is not None and _is_immutable(result) and all(
+                _is_immutable(value) if value is not _MISSING else name not in _IMPURE_BUILTINS
+                for name, value in inputs):
+            if len(self._eval_cache) >= EVAL_CACHE_SIZE:
+                self._eval_cache.clear()
+            self._eval_cache[expr] = (code, inputs, result)
         else:
-            return self._eval_cache.setdefault(expr, eval(expr, self.namespace, local_namespace))
+            self._eval_cache.pop(expr, None)
+        return result
 
     ##############################################
     # Add/remove stuff
@@ -315,7 +624,7 @@ class FlowGraph(Element):
             return self.options_block
         try:
             block = self.parent_platform.make_block(self, block_id, **kwargs)
-            self.blocks.append(block)
+            self._add_block(block)
         except KeyError:
             block = None
         return block
@@ -335,12 +644,13 @@ class FlowGraph(Element):
         connection = self.parent_platform.Connection(
             parent=self, source=porta, sink=portb)
         self.connections.add(connection)
+        porta.mark_dirty()
+        portb.mark_dirty()
 
         return connection
 
     def disconnect(self, *ports):
-        to_be_removed = [con for con in self.connections
-                         if any(port in con for port in ports)]
+        to_be_removed = {con for port in ports for con in self.connections.of_port(port)}
         for con in to_be_removed:
             self.remove_element(con)
 
@@ -360,10 +670,12 @@ class FlowGraph(Element):
         if element in self.blocks:
             # Remove block, remove all involved connections
             self.disconnect(*element.ports())
-            self.blocks.remove(element)
+            self._remove_block(element)
 
         elif element in self.connections:
             self.connections.remove(element)
+            for port in element:
+                port.mark_dirty()
 
     ##############################################
     # Import/Export Methods
@@ -411,13 +723,14 @@ class FlowGraph(Element):
         """
         # Remove previous elements
         del self.blocks[:]
+        self._blocks_by_name.clear()
         self.connections.clear()
 
         file_format = data['metadata']['file_format']
 
         # build the blocks
         self.options_block.import_data(name='', **data.get('options', {}))
-        self.blocks.append(self.options_block)
+        self._add_block(self.options_block)
 
         for block_data in data.get('blocks', []):
             block_id = block_data['id']
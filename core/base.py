@@ -14,17 +14,36 @@ class Element(object):
     def __init__(self, parent=None):
         self._parent = weakref.ref(parent) if parent else lambda: None
         self._error_messages = []
+        self._dirty = True  # changed since the last validation
+        self._validation_start = None  # index of the first message added by validate()
 
     ##################################################
     # Element Validation API
     ##################################################
     def validate(self):
         """
-        Validate this element and call validate on all children.
+        Validate this element and call validate on all dirty children.
         Call this base method before adding error messages in the subclass.
+        The messages of the last validation are replaced, those of the last
+        rewrite are kept.
         """
+        if self._validation_start is None:
+            self._validation_start = len(self._error_messages)
+        del self._error_messages[self._validation_start:]
+        self._dirty = False
         for child in self.children():
-            child.validate()
+            if child._dirty:
+                child.validate()
+
+    def mark_dirty(self):
+        """
+        Flag this element (and its parents) to be validated again.
+        Clean elements keep the error messages of their last validation.
+        """
+        element = self
+        while element is not None:
+            element._dirty = True
+            element = element.parent
 
     def is_valid(self):
         """
@@ -76,6 +95,8 @@ class Element(object):
         Call this base method before rewriting the element.
         """
         del self._error_messages[:]
+        self._validation_start = None
+        self.mark_dirty()
         for child in self.children():
             child.rewrite()
 
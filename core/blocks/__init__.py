@@ -10,7 +10,8 @@ from ._templates import MakoTemplates
 
 from .block import Block
 
-from ._build import build
+from ._build import build, dump, restore
+from ._registry import BlockStub, LazyBlockRegistry
 
 
 build_ins = {}
@@ -68,6 +68,40 @@ def build(id, label='', category='', flags='', documentation='',
     return cls
 
 
+def dump(cls):
+    """Get the state of a block class made by build() as plain (picklable) data"""
+    return dict(
+        key=cls.key,
+        label=cls.label,
+        category=list(cls.category),
+        flags=sorted(cls.flags.data),
+        # extracted docstrings are not part of the state, these are queried again
+        documentation=cls.documentation.get('', ''),
+        asserts=list(cls.asserts),
+        inputs_data=cls.inputs_data,
+        outputs_data=cls.outputs_data,
+        parameters_data=cls.parameters_data,
+        extra_data=cls.extra_data,
+        templates=dict(cls.templates),
+        cpp_templates=dict(cls.cpp_templates),
+        value=cls.value,
+        loaded_from=cls.loaded_from,
+    )
+
+
+def restore(state):
+    """Make a block class from the state returned by dump()"""
+    state = dict(state)
+    cls = type(str(state['key']), (Block,), {})
+    cls.flags = Flags(state.pop('flags'))
+    cls.documentation = {'': state.pop('documentation')}
+    cls.templates = MakoTemplates(**state.pop('templates'))
+    cls.cpp_templates = MakoTemplates(**state.pop('cpp_templates'))
+    for name, value in state.items():
+        setattr(cls, name, value)
+    return cls
+
+
 def build_ports(ports_raw, direction):
     ports = []
     port_ids = set()
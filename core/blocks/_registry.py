@@ -0,0 +1,85 @@
+# Copyright 2021 Free Software Foundation, Inc.
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+
+from collections.abc import MutableMapping
+
+
+class BlockStub(object):
+    """Index entry of a block whose class has not been built yet"""
+
+    __slots__ = ('key', 'label', 'category', 'loaded_from', 'state')
+
+    def __init__(self, key, label, category, loaded_from, state=None):
+        self.key = key
+        self.label = label
+        self.category = category
+        self.loaded_from = loaded_from
+        self.state = state  # pickled block class state (from a library snapshot)
+
+    def __repr__(self):
+        return 'BlockStub({!r}, {!r})'.format(self.key, self.loaded_from)
+
+
+class LazyBlockRegistry(MutableMapping):
+    """
+    Mapping of block ids to block classes, that are built on first access
+
+    Args:
+        build: callable making the block class of a BlockStub (None on error)
+    """
+
+    def __init__(self, build):
+        self._build = build
+        self._classes = {}
+        self._stubs = {}
+
+    def add_stub(self, key, label, category, loaded_from, state=None):
+        self._classes.pop(key, None)
+        self._stubs[key] = BlockStub(key, label, category, loaded_from, state)
+
+    def peek(self, key):
+        """Get the block class or stub without building it"""
+        try:
+            return self._classes[key]
+        except KeyError:
+            return self._stubs[key]
+
+    def entries(self):
+        """Iterate over (key, block class or stub) pairs without building any class"""
+        for key in list(self):
+            yield key, self.peek(key)
+
+    def __getitem__(self, key):
+        try:
+            return self._classes[key]
+        except KeyError:
+            stub = self._stubs.pop(key)
+        cls = self._build(stub)
+        if cls is None:  # broken description, dropped like in eager loading
+            raise KeyError(key)
+        self._classes[key] = cls
+        return cls
+
+    def __setitem__(self, key, cls):
+        self._stubs.pop(key, None)
+        self._classes[key] = cls
+
+    def __delitem__(self, key):
+        if self._classes.pop(key, None) is None:
+            del self._stubs[key]
+
+    def __contains__(self, key):
+        return key in self._classes or key in self._stubs
+
+    def __iter__(self):
+        return iter(list(self._classes) + list(self._stubs))
+
+    def __len__(self):
+        return len(self._classes) + len(self._stubs)
+
+    def clear(self):
+        self._classes.clear()
+        self._stubs.clear()
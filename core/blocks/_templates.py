@@ -7,12 +7,16 @@
 This dict class holds a (shared) cache of compiled mako templates.
 These
 
+The templates bound to a block also keep the rendered results, until a param
+of the block changes (see Block.params_revision).
 """
 
-from mako.template import Template
+import collections
+
 from mako.exceptions import SyntaxException
 
 from ..errors import TemplateError
+from ..utils import template_cache
 
 # The utils dict contains convenience functions
 # that can be called from any template
@@ -28,30 +32,45 @@ utils = {'no_quotes': no_quotes}
 class MakoTemplates(dict):
 
     _template_cache = {}
+    render_stats = collections.Counter()  # hits and misses of the rendered results
 
     def __init__(self, _bind_to=None, *args, **kwargs):
         self.instance = _bind_to
+        self._rendered = {}  # item -> (params revision, text, result)
         dict.__init__(self, *args, **kwargs)
 
     def __get__(self, instance, owner):
         if instance is None or self.instance is not None:
             return self
         copy = self.__class__(_bind_to=instance, **self)
-        if getattr(instance.__class__, 'templates', None) is self:
-            setattr(instance, 'templates', copy)
+        for name in ('templates', 'cpp_templates'):
+            if getattr(owner, name, None) is self:
+                setattr(instance, name, copy)
         return copy
 
+    def __copy__(self):
+        return self.__class__(_bind_to=self.instance, **self)
+
     @classmethod
     def compile(cls, text):
         text = str(text)
         try:
-            template = Template(text, strict_undefined=True)
+            template = template_cache.from_text(text, strict_undefined=True)
         except SyntaxException as error:
             raise TemplateError(text, *error.args)
 
         cls._template_cache[text] = template
         return template
 
+    @classmethod
+    def precompile(cls, templates):
+        """Compile the template texts of (a list of) MakoTemplates ahead of time"""
+        texts = set()
+        for text in (text for t in templates for text in t.values()):
+            texts.update(map(str, text) if isinstance(text, list) else [str(text)])
+        texts.discard('')
+        template_cache.precompile(texts, strict_undefined=True)
+
     def _get_template(self, text):
         try:
             return self._template_cache[str(text)]
@@ -62,6 +81,22 @@ class MakoTemplates(dict):
         text = self.get(item)
         if not text:
             return ''
+        revision = getattr(self.instance, 'params_revision', None)
+        if revision is None:  # no way to tell when the results are outdated
+            return self._render(text)
+        try:
+            cached_revision, cached_text, result = self._rendered[item]
+            if cached_revision == revision and cached_text == text:
+                self.render_stats['hits'] += 1
+                return list(result) if isinstance(result, list) else result
+        except KeyError:
+            pass
+        self.render_stats['misses'] += 1
+        result = self._render(text)
+        self._rendered[item] = revision, text, result
+        return list(result) if isinstance(result, list) else result
+
+    def _render(self, text):
         namespace = self.instance.namespace_templates
         namespace = {**namespace, **utils}
 
@@ -20,6 +20,7 @@ from ._templates import MakoTemplates
 from ._flags import Flags
 
 from ..base import Element
+from ..utils import import_cache
 from ..utils.descriptors import lazy_property
 
 def _get_elem(iterable, key):
@@ -53,6 +54,7 @@ class Block(Element):
 
     extra_data = {}
     loaded_from = '(unknown)'
+    params_revision = 0  # changes with the values of the params
 
     def __init__(self, parent):
         """Make a new block from nested data."""
@@ -81,7 +83,7 @@ class Block(Element):
             # This is a workaround to allow embedded python blocks/modules to load as there is
             # currently 'cpp' in the flags by default caused by the other built-in blocks
             if hasattr(self, 'cpp_templates'):
-                self.orig_cpp_templates = self.cpp_templates # The original template, in case we have to edit it when transpiling to C++
+                self.orig_cpp_templates = copy.copy(self.cpp_templates) # The original template, in case we have to edit it when transpiling to C++
 
         self.current_bus_structure = {'source': None, 'sink': None}
 
@@ -135,7 +137,7 @@ class Block(Element):
         imports = ""
         try:
             imports = self.templates.render('imports')
-            exec(imports, self.block_namespace)
+            import_cache.exec_imports(imports, self.block_namespace)
         except ImportError:
             # We do not have a good way right now to determine if an import is for a
             # hier block, these imports will fail as they are not in the search path
@@ -164,10 +166,9 @@ class Block(Element):
             removed_bus_connections = []
             if 'bus' in map(lambda a: a.dtype, ports):
                 for port in ports_gui:
-                    for c in self.parent_flowgraph.connections:
-                        if port is c.source_port or port is c.sink_port:
-                            removed_bus_ports.append(port)
-                            removed_bus_connections.append(c)
+                    for c in list(self.parent_flowgraph.connections.of_port(port)):
+                        removed_bus_ports.append(port)
+                        removed_bus_connections.append(c)
                     ports.remove(port)
 
 
@@ -330,6 +331,7 @@ class Block(Element):
     def state(self, value):
         """Sets the state for the block."""
         self.states['state'] = value
+        self.mark_dirty()
 
     # Enable/Disable Aliases
     @property
@@ -653,24 +655,25 @@ class Block(Element):
         """
         Import this block's params from nested data.
         Any param keys that do not exist will be ignored.
-        Since params can be dynamically created based another param,
-        call rewrite, and repeat the load until the params stick.
+        Since params can be dynamically created based another param
+        (embedded python blocks), call rewrite and repeat the load only
+        while this creates missing params. The block is rewritten later
+        with the whole flow graph.
         """
         self.params['id'].value = name
         self.states.update(states)
 
-        def get_hash():
-            return hash(tuple(hash(v) for v in self.params.values()))
-
-        pre_rewrite_hash = -1
-        while pre_rewrite_hash != get_hash():
+        missing = None
+        while True:
             for key, value in parameters.items():
                 try:
                     self.params[key].set_value(value)
                 except KeyError:
                     continue
-            # Store hash and call rewrite
-            pre_rewrite_hash = get_hash()
+            still_missing = parameters.keys() - self.params.keys()
+            if not still_missing or still_missing == missing:
+                break
+            missing = still_missing
             self.rewrite()
 
     ##############################################
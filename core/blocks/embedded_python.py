@@ -193,9 +193,12 @@ class EPyBlock(Block):
         self.parent_flowgraph.disconnect(*ports_to_remove)
 
     def validate(self):
+        param_src = self.params['_source_code']
+        # the reload error is added below, so its messages are replaced each time
+        param_src._dirty = True
         super(EPyBlock, self).validate()
         if self._epy_reload_error:
-            self.params['_source_code'].add_error_message(str(self._epy_reload_error))
+            param_src.add_error_message(str(self._epy_reload_error))
 
 
 @register_build_in
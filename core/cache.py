@@ -3,25 +3,54 @@
 #
 # SPDX-License-Identifier: GPL-2.0-or-later
 #
+"""
+Block description cache
+
+The cache is a single binary file: a header with the GRC version followed by
+a sequence of records, one per description file. Each record is
+
+    struct RECORD (cached-at, key length, data length) | key | pickled data
+
+On load only the record headers and keys are read (from a memory map) to
+build the index, the data of an entry is unpickled when it is requested.
+Updated entries are appended to the end of the file, so an update does not
+rewrite the whole cache. The file is compacted once the space taken up by
+outdated records outweighs the live ones.
+
+Processes sharing the cache save it under a file lock. A compaction keeps
+the records other processes appended since this one loaded the cache.
+"""
 
-import json
 import logging
+import mmap
 import os
+import pickle
+import struct
 import time
 
 from .io import yaml
+from .utils.file_lock import locked
 
 logger = logging.getLogger(__name__)
 
+MAGIC = b'GRCCACHE\x03'
+HEADER = struct.Struct('<I')  # length of version string
+RECORD = struct.Struct('<dII')  # cached-at, key length, data length
+
 
 class Cache(object):
 
     def __init__(self, filename, version = None):
         self.cache_file = filename
         self.version = version
-        self.cache = {}
-        self._cachetime = None
+        self._index = {}  # filename -> (cached-at, offset, length) in self._map
+        self._loaded_files = set()  # the filenames in the file when it was loaded
+        self._new_entries = {}  # filename -> (cached-at, pickled data)
+        self._map = None
+        self._end_of_file = 0
+        self._dead_bytes = 0
         self.need_cache_write = True
+        self.need_cache_rewrite = True
         self._accessed_items = set()
         try:
             os.makedirs(os.path.dirname(filename))
@@ -33,67 +62,189 @@ class Cache(object):
             self._converter_mtime = -1
 
     def load(self):
+        self.need_cache_write = False
+        self.need_cache_rewrite = False
         try:
-            self.need_cache_write = False
             logger.debug(f"Loading block cache from: {self.cache_file}")
-            with open(self.cache_file, encoding='utf-8') as cache_file:
-                cache = json.load(cache_file)
-            cacheversion = cache.get("version", None)
-            logger.debug(f"Cache version {cacheversion}")
-            self._cachetime = cache.get("cached-at", 0)
-            if cacheversion == self.version:
-                logger.debug("Loaded block cache")
-                self.cache = cache["cache"]
-            else:
-                logger.info(f"Outdated cache {self.cache_file} found, "
-                            "will be overwritten.")
-                raise ValueError()
+            with open(self.cache_file, 'rb') as cache_file:
+                self._map = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+            offset = self._read_header()
+            self._read_index(offset)
+            self._loaded_files = set(self._index)
+            logger.debug("Loaded block cache index ({} entries)".format(len(self._index)))
         except (IOError, ValueError):
-            self.need_cache_write = True
+            self._close_map()
+            self._index.clear()
+            self._loaded_files.clear()
+            self.need_cache_write = self.need_cache_rewrite = True
 
-    def get_or_load(self, filename):
-        self._accessed_items.add(filename)
+    def _read_header(self):
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError('Not a block cache file')
+        offset = len(MAGIC)
+        version_length, = HEADER.unpack_from(self._map, offset)
+        offset += HEADER.size
+        cacheversion = self._map[offset:offset + version_length].decode('utf-8')
+        logger.debug(f"Cache version {cacheversion}")
+        if cacheversion != str(self.version):
+            logger.info(f"Outdated cache {self.cache_file} found, "
+                        "will be overwritten.")
+            raise ValueError()
+        return offset + version_length
+
+    def _read_index(self, offset):
+        size = len(self._map)
+        while offset + RECORD.size <= size:
+            cached_at, key_length, data_length = RECORD.unpack_from(self._map, offset)
+            key_offset = offset + RECORD.size
+            data_offset = key_offset + key_length
+            if data_offset + data_length > size:
+                break  # incomplete record (interrupted write)
+            filename = self._map[key_offset:data_offset].decode('utf-8')
+            previous = self._index.get(filename)
+            if previous:  # superseded by a record appended later
+                self._dead_bytes += RECORD.size + key_length + previous[2]
+            self._index[filename] = cached_at, data_offset, data_length
+            offset = data_offset + data_length
+
+        self._end_of_file = offset
+        if offset != size:
+            logger.info(f"Truncated cache {self.cache_file} found, will be rewritten.")
+            self.need_cache_write = self.need_cache_rewrite = True
+
+    def _get_cached_at(self, filename):
+        try:
+            return self._new_entries[filename][0]
+        except KeyError:
+            return self._index[filename][0]
+
+    def is_cached(self, filename):
+        """Check for an up-to-date cache entry of filename"""
         modtime = os.path.getmtime(filename)
         if modtime <= self._converter_mtime:
             try:
-                cached = self.cache[filename]
-                if int(cached["cached-at"]+0.5) >= modtime:
-                    return cached["data"]
+                cached_at = self._get_cached_at(filename)
+                if int(cached_at+0.5) >= modtime:
+                    return True
                 logger.info(f"Cache for {filename} outdated, loading yaml")
             except KeyError:
                 pass
+        return False
+
+    def get_or_load(self, filename):
+        self._accessed_items.add(filename)
+        if self.is_cached(filename):
+            try:
+                return self._get_data(filename)
+            except Exception:
+                logger.info(f"Cache for {filename} unreadable, loading yaml")
 
         with open(filename, encoding='utf-8') as fp:
             data = yaml.safe_load(fp)
-        self.cache[filename] = {
-            "cached-at": int(time.time()),
-            "data": data
-        }
-        self.need_cache_write = True
+        self.store(filename, data)
         return data
 
+    def _get_data(self, filename):
+        try:
+            return pickle.loads(self._new_entries[filename][1])
+        except KeyError:
+            _, offset, length = self._index[filename]
+            return pickle.loads(self._map[offset:offset + length])
+
+    def store(self, filename, data):
+        """Add (or replace) the cache entry of filename"""
+        self._accessed_items.add(filename)
+        self._new_entries[filename] = (
+            int(time.time()), pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+        self.need_cache_write = True
+
     def save(self):
         if not self.need_cache_write:
             return
 
-        logger.debug('Saving %d entries to json cache', len(self.cache))
-        # Dumping to binary file is only supported for Python3 >= 3.6
-        with open(self.cache_file, 'w', encoding='utf8') as cache_file:
-            cache_content = {
-                "version": self.version,
-                "cached-at": self._cachetime,
-                "cache": self.cache
-            }
-            cache_file.write(
-                json.dumps(cache_content, ensure_ascii=False))
+        live_bytes = self._end_of_file - self._dead_bytes
+        if self._dead_bytes + self._replaced_bytes() > live_bytes:
+            self.need_cache_rewrite = True  # compact
+
+        try:
+            with locked(self.cache_file):
+                if self.need_cache_rewrite:
+                    self._rewrite()
+                else:
+                    self._append()
+        except (IOError, OSError) as error:
+            logger.warning(f"Failed to save block cache {self.cache_file}: {error}")
+        finally:
+            self._close_map()
+
+    def _replaced_bytes(self):
+        return sum(RECORD.size + len(filename.encode('utf-8')) + self._index[filename][2]
+                   for filename in self._new_entries if filename in self._index)
+
+    def _append(self):
+        logger.debug('Appending %d entries to block cache', len(self._new_entries))
+        self._close_map()
+        with open(self.cache_file, 'ab') as cache_file:
+            cache_file.write(b''.join(
+                _pack_record(filename, cached_at, data)
+                for filename, (cached_at, data) in self._new_entries.items()
+            ))
+
+    def _rewrite(self):
+        entries = {filename: (cached_at, self._map[offset:offset + length])
+                   for filename, (cached_at, offset, length) in self._index.items()}
+        self._merge_saved_entries(entries)
+        entries.update(self._new_entries)
+        logger.debug('Saving %d entries to block cache', len(entries))
+
+        version = str(self.version).encode('utf-8')
+        temp_file = '{}.{}.tmp'.format(self.cache_file, os.getpid())
+        with open(temp_file, 'wb') as cache_file:
+            cache_file.write(MAGIC + HEADER.pack(len(version)) + version)
+            for filename, (cached_at, data) in entries.items():
+                cache_file.write(_pack_record(filename, cached_at, data))
+        self._close_map()  # a mapped file can't be replaced on all platforms
+        os.replace(temp_file, self.cache_file)
+
+    def _merge_saved_entries(self, entries):
+        """Add the (newer) records other processes saved since the load to entries"""
+        current = Cache(self.cache_file, self.version)
+        current.load()
+        try:
+            for filename, (cached_at, offset, length) in current._index.items():
+                if filename in entries:
+                    if entries[filename][0] > cached_at:
+                        continue  # the record saved last wins (times are in seconds)
+                elif filename in self._loaded_files:
+                    continue  # pruned
+                entries[filename] = cached_at, current._map[offset:offset + length]
+        finally:
+            current._close_map()
+
+    def close(self):
+        """Save the updated entries and release the file"""
+        self.save()
+        self._close_map()
+
+    def _close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
 
     def prune(self):
-        for filename in (set(self.cache) - self._accessed_items):
-            del self.cache[filename]
+        for filename in (set(self._index) | set(self._new_entries)) - self._accessed_items:
+            self._index.pop(filename, None)
+            self._new_entries.pop(filename, None)
+            self.need_cache_write = self.need_cache_rewrite = True
 
     def __enter__(self):
         self.load()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.save()
+        self.close()
+
+
+def _pack_record(filename, cached_at, data):
+    key = filename.encode('utf-8')
+    return RECORD.pack(cached_at, len(key), len(data)) + key + data
@@ -5,6 +5,9 @@
 #
 
 
+import collections
+
+from .. import blocks
 from ..utils import expr_utils
 from operator import methodcaller, attrgetter
 
@@ -119,6 +122,63 @@ class FlowGraphProxy(object):  # TODO: move this in a refactored Generator
                     key_offset += len(pad.sinks) + len(pad.sources)
         return -1
 
+    def get_resolved_connections(self):
+        """
+        Get the enabled connections to generate code for: the connections of
+        virtual blocks are resolved and bypassed blocks are connected around.
+
+        Returns:
+            a list of connections
+        """
+        connection_factory = self.parent_platform.Connection
+        connections = self.get_enabled_connections()
+
+        # Get the virtual blocks and resolve their connections
+        for connection in list(connections):
+            if isinstance(connection.source_block, blocks.VirtualSource):
+                sink = connection.sink_port
+                for source in connection.source_port.resolve_virtual_source():
+                    connections.append(connection_factory(self.orignal_flowgraph, source, sink))
+        connections = [c for c in connections if not (
+            isinstance(c.source_block, blocks.VirtualSource) or
+            isinstance(c.sink_block, blocks.VirtualSink))]
+
+        # Bypassing blocks: Create new connections that bypass the selected block and
+        # remove the existing ones. The new connections are indexed as well, this allows
+        # adjacent bypassed blocks to see the newly created connections to downstream
+        # blocks, allowing them to correctly construct bypass connections.
+        by_sink_port = collections.defaultdict(list)
+        by_source_port = collections.defaultdict(list)
+        for connection in connections:
+            by_sink_port[connection.sink_port].append(connection)
+            by_source_port[connection.source_port].append(connection)
+        removed = set()  # ids of the replaced connections
+
+        for block in self.get_bypassed_blocks():
+            # Get the upstream connection (off of the sink ports)
+            source_connection = [c for c in by_sink_port[block.sinks[0]] if id(c) not in removed]
+            # The source connection should never have more than one element.
+            assert (len(source_connection) == 1)
+
+            # Get the source of the connection.
+            source_port = source_connection[0].source_port
+
+            # Loop through all the downstream connections
+            for sink in list(by_source_port[block.sources[0]]):
+                if id(sink) in removed or not sink.enabled:
+                    # Ignore replaced and disabled connections
+                    continue
+                connection = connection_factory(self.orignal_flowgraph, source_port, sink.sink_port)
+                connections.append(connection)
+                by_sink_port[connection.sink_port].append(connection)
+                by_source_port[connection.source_port].append(connection)
+                # Remove this sink connection
+                removed.add(id(sink))
+            # Remove the source connection
+            removed.add(id(source_connection[0]))
+
+        return [c for c in connections if id(c) not in removed]
+
     def get_cpp_variables(self):
         """
         Get a list of all variables (C++) in this flow graph namespace.
@@ -7,11 +7,17 @@
 
 
 from .hier_block import HierBlockGenerator, QtHierBlockGenerator
-from .top_block import TopBlockGenerator
-from .cpp_top_block import CppTopBlockGenerator
+from .top_block import TopBlockGenerator, PYTHON_TEMPLATE, get_template
+from .cpp_top_block import CppTopBlockGenerator, HEADER_TEMPLATE, SOURCE_TEMPLATE, CMAKE_TEMPLATE
 from .cpp_hier_block import CppHierBlockGenerator
 
 
+def precompile_templates():
+    """Compile the templates of the generators ahead of time"""
+    for filename in (PYTHON_TEMPLATE, HEADER_TEMPLATE, SOURCE_TEMPLATE, CMAKE_TEMPLATE):
+        get_template(filename)
+
+
 class Generator(object):
     """Adaptor for various generators (uses generate_options)"""
 
@@ -4,4 +4,4 @@
 # SPDX-License-Identifier: GPL-2.0-or-later
 #
 
-from .Generator import Generator
+from .Generator import Generator, precompile_templates
@@ -1,8 +1,6 @@
 import collections
 import os
 
-import codecs
-
 from .cpp_top_block import CppTopBlockGenerator
 
 from .. import Constants
@@ -30,9 +28,9 @@ class CppHierBlockGenerator(CppTopBlockGenerator):
         self.file_path = os.path.join(hier_block_lib_dir, self._flow_graph.get_option('id'))
         self.file_path_yml = self.file_path + '.block.yml'
 
-    def write(self):
-        """generate output and write it to files"""
-        CppTopBlockGenerator.write(self)
+    def _write_outputs(self, output):
+        """Write the generated files and the block description"""
+        CppTopBlockGenerator._write_outputs(self, output)
 
         data = yaml.dump(self._build_block_n_from_flow_graph_io())
 
@@ -49,11 +47,10 @@ class CppHierBlockGenerator(CppTopBlockGenerator):
         for r in replace:
             data = data.replace(*r)
 
-        with codecs.open(self.file_path_yml, 'w', encoding='utf-8') as fp:
-            fp.write(data)
-
         # Windows only supports S_IREAD and S_IWRITE, other flags are ignored
-        os.chmod(self.file_path_yml, self._mode)
+        with output(self.file_path_yml, self._mode) as fp:
+            fp.write(data)
+        self.output_files.append(self.file_path_yml)
 
 
     def _build_block_n_from_flow_graph_io(self):
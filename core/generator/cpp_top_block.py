@@ -1,4 +1,3 @@
-import codecs
 import yaml
 import operator
 import os
@@ -7,13 +6,12 @@ import textwrap
 import re
 import ast
 
-from mako.template import Template
-
-from .. import Messages, blocks
+from .. import Messages
 from ..Constants import TOP_BLOCK_FILE_MODE
 from .FlowGraphProxy import FlowGraphProxy
 from ..utils import expr_utils
-from .top_block import TopBlockGenerator
+from .top_block import TopBlockGenerator, get_connection_template, get_template
+from .writer import atomic_outputs
 
 DATA_DIR = os.path.dirname(__file__)
 
@@ -21,10 +19,6 @@ HEADER_TEMPLATE = os.path.join(DATA_DIR, 'cpp_templates/flow_graph.hpp.mako')
 SOURCE_TEMPLATE = os.path.join(DATA_DIR, 'cpp_templates/flow_graph.cpp.mako')
 CMAKE_TEMPLATE = os.path.join(DATA_DIR, 'cpp_templates/CMakeLists.txt.mako')
 
-header_template = Template(filename=HEADER_TEMPLATE)
-source_template = Template(filename=SOURCE_TEMPLATE)
-cmake_template = Template(filename=CMAKE_TEMPLATE)
-
 
 class CppTopBlockGenerator(object):
 
@@ -48,6 +42,8 @@ class CppTopBlockGenerator(object):
         filename = self._flow_graph.get_option('id')
         self.file_path = os.path.join(output_dir, filename)
         self.output_dir = output_dir
+        self.output_files = []  # all files written by write()
+        self.changed_files = []  # the output files with new contents
         
     def _warnings(self):
         throttling_blocks = [b for b in self._flow_graph.get_enabled_blocks()
@@ -95,22 +91,32 @@ class CppTopBlockGenerator(object):
         if not os.path.exists(self.file_path):
             os.makedirs(self.file_path)
 
+        # no file is replaced if rendering any of them fails
+        with atomic_outputs(self.changed_files) as output:
+            self._write_outputs(output)
+
+    def _write_outputs(self, output):
+        """Write the generated files (see writer.atomic_outputs)"""
+        fg = self._flow_graph
         for filename, data in self._build_cpp_header_code_from_template():
-            with codecs.open(filename, 'w', encoding='utf-8') as fp:
+            with output(filename) as fp:
                 fp.write(data)
+            self.output_files.append(filename)
 
         if not self._generate_options.startswith('hb'):
             if not os.path.exists(os.path.join(self.file_path, 'build')):
                 os.makedirs(os.path.join(self.file_path, 'build'))
 
             for filename, data in self._build_cpp_source_code_from_template():
-                with codecs.open(filename, 'w', encoding='utf-8') as fp:
+                with output(filename) as fp:
                     fp.write(data)
+                self.output_files.append(filename)
 
             if fg.get_option('gen_cmake') == 'On':
                 for filename, data in self._build_cmake_code_from_template():
-                    with codecs.open(filename, 'w', encoding='utf-8') as fp:
+                    with output(filename) as fp:
                         fp.write(data)
+                    self.output_files.append(filename)
 
     def _build_cpp_source_code_from_template(self):
         """
@@ -123,7 +129,7 @@ class CppTopBlockGenerator(object):
 
         output = []
 
-        flow_graph_code = source_template.render(
+        flow_graph_code = get_template(SOURCE_TEMPLATE).render(
             title=self.title,
             includes=self._includes(),
             blocks=self._blocks(),
@@ -149,7 +155,7 @@ class CppTopBlockGenerator(object):
 
         output = []
 
-        flow_graph_code = header_template.render(
+        flow_graph_code = get_template(HEADER_TEMPLATE).render(
             title=self.title,
             includes=self._includes(),
             blocks=self._blocks(),
@@ -184,7 +190,7 @@ class CppTopBlockGenerator(object):
 
         output = []
 
-        flow_graph_code = cmake_template.render(
+        flow_graph_code = get_template(CMAKE_TEMPLATE).render(
             title=self.title,
             includes=self._includes(),
             blocks=self._blocks(),
@@ -376,7 +382,7 @@ class CppTopBlockGenerator(object):
 
     def _connections(self):
         fg = self._flow_graph
-        templates = {key: Template(text)
+        templates = {key: get_connection_template(text)
                      for key, text in fg.parent_platform.cpp_connection_templates.items()}
 
         def make_port_sig(port):
@@ -398,49 +404,7 @@ class CppTopBlockGenerator(object):
 
             return '{block}, {key}'.format(block=block, key=key)
 
-        connections = fg.get_enabled_connections()
-
-        # Get the virtual blocks and resolve their connections
-        connection_factory = fg.parent_platform.Connection
-        virtual_source_connections = [c for c in connections if isinstance(c.source_block, blocks.VirtualSource)]
-        for connection in virtual_source_connections:
-            sink = connection.sink_port
-            for source in connection.source_port.resolve_virtual_source():
-                resolved = connection_factory(fg.orignal_flowgraph, source, sink)
-                connections.append(resolved)
-
-        virtual_connections = [c for c in connections if (isinstance(c.source_block, blocks.VirtualSource) or isinstance(c.sink_block, blocks.VirtualSink))]
-        for connection in virtual_connections:
-            # Remove the virtual connection
-            connections.remove(connection)
-
-        # Bypassing blocks: Need to find all the enabled connections for the block using
-        # the *connections* object rather than get_connections(). Create new connections
-        # that bypass the selected block and remove the existing ones. This allows adjacent
-        # bypassed blocks to see the newly created connections to downstream blocks,
-        # allowing them to correctly construct bypass connections.
-        bypassed_blocks = fg.get_bypassed_blocks()
-        for block in bypassed_blocks:
-            # Get the upstream connection (off of the sink ports)
-            # Use *connections* not get_connections()
-            source_connection = [c for c in connections if c.sink_port == block.sinks[0]]
-            # The source connection should never have more than one element.
-            assert (len(source_connection) == 1)
-
-            # Get the source of the connection.
-            source_port = source_connection[0].source_port
-
-            # Loop through all the downstream connections
-            for sink in (c for c in connections if c.source_port == block.sources[0]):
-                if not sink.enabled:
-                    # Ignore disabled connections
-                    continue
-                connection = connection_factory(fg.orignal_flowgraph, source_port, sink.sink_port)
-                connections.append(connection)
-                # Remove this sink connection
-                connections.remove(sink)
-            # Remove the source connection
-            connections.remove(source_connection[0])
+        connections = fg.get_resolved_connections()
 
         # List of connections where each endpoint is enabled (sorted by domains, block names)
         def by_domain_and_blocks(c):
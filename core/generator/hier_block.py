@@ -1,8 +1,6 @@
 import collections
 import os
 
-import codecs
-
 from .top_block import TopBlockGenerator
 
 from .. import Constants
@@ -30,9 +28,9 @@ class HierBlockGenerator(TopBlockGenerator):
         self._mode = Constants.HIER_BLOCK_FILE_MODE
         self.file_path_yml = self.file_path[:-3] + '.block.yml'
 
-    def write(self):
-        """generate output and write it to files"""
-        TopBlockGenerator.write(self)
+    def _write_outputs(self, output):
+        """Write the generated files and the block description"""
+        TopBlockGenerator._write_outputs(self, output)
 
         data = yaml.dump(self._build_block_n_from_flow_graph_io())
 
@@ -48,11 +46,10 @@ class HierBlockGenerator(TopBlockGenerator):
         for r in replace:
             data = data.replace(*r)
 
-        with codecs.open(self.file_path_yml, 'w', encoding='utf-8') as fp:
-            fp.write(data)
-
         # Windows only supports S_IREAD and S_IWRITE, other flags are ignored
-        os.chmod(self.file_path_yml, self._mode)
+        with output(self.file_path_yml, self._mode) as fp:
+            fp.write(data)
+        self.output_files.append(self.file_path_yml)
 
     def _build_block_n_from_flow_graph_io(self):
         """
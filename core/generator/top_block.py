@@ -1,21 +1,30 @@
-import codecs
+import functools
 import operator
 import os
 import tempfile
 import textwrap
 
-from mako.template import Template
-
-from .. import Messages, blocks
+from .. import Messages
 from ..Constants import TOP_BLOCK_FILE_MODE
 from .FlowGraphProxy import FlowGraphProxy
-from ..utils import expr_utils
+from .writer import atomic_outputs, render_stripped
+from ..utils import expr_utils, template_cache
 
 DATA_DIR = os.path.dirname(__file__)
 
 PYTHON_TEMPLATE = os.path.join(DATA_DIR, 'flow_graph.py.mako')
 
-python_template = Template(filename=PYTHON_TEMPLATE)
+
+@functools.lru_cache(maxsize=None)
+def get_template(filename):
+    """Get the compiled template of a generator file (compiled on first use)"""
+    return template_cache.from_file(filename)
+
+
+@functools.lru_cache(maxsize=None)
+def get_connection_template(text):
+    """Get the compiled template of a connection (shared by all generators)"""
+    return template_cache.from_text(text)
 
 
 class TopBlockGenerator(object):
@@ -40,6 +49,8 @@ class TopBlockGenerator(object):
         filename = self._flow_graph.get_option('id') + '.py'
         self.file_path = os.path.join(output_dir, filename)
         self.output_dir = output_dir
+        self.output_files = []  # all files written by write()
+        self.changed_files = []  # the output files with new contents
 
     def _warnings(self):
         throttling_blocks = [b for b in self._flow_graph.get_enabled_blocks()
@@ -80,18 +91,27 @@ class TopBlockGenerator(object):
             'generate_options': self._generate_options,
         }
 
+        # no file is replaced if rendering any of them fails
+        with atomic_outputs(self.changed_files) as output:
+            self._write_outputs(output)
+
+    def _write_outputs(self, output):
+        """Write the generated files (see writer.atomic_outputs)"""
         for filename, data in self._build_python_code_from_template():
-            with codecs.open(filename, 'w', encoding='utf-8') as fp:
-                fp.write(data)
-            if filename == self.file_path:
-                os.chmod(filename, self._mode)
+            mode = self._mode if filename == self.file_path else None
+            with output(filename, mode) as fp:
+                if callable(data):
+                    data(fp)
+                else:
+                    fp.write(data)
+            self.output_files.append(filename)
 
     def _build_python_code_from_template(self):
         """
         Convert the flow graph to python code.
 
         Returns:
-            a string of python code
+            a list of (file path, code or a function writing the code to a file)
         """
         output = []
 
@@ -122,7 +142,9 @@ class TopBlockGenerator(object):
             'version': platform.config.version,
             'catch_exceptions': fg.get_option('catch_exceptions')
         }
-        flow_graph_code = python_template.render(
+        # rendered while writing, without trailing white-space
+        flow_graph_code = functools.partial(
+            render_stripped, get_template(PYTHON_TEMPLATE),
             title=title,
             imports=self._imports(),
             blocks=self._blocks(),
@@ -130,8 +152,6 @@ class TopBlockGenerator(object):
             connections=self._connections(),
             **self.namespace
         )
-        # strip trailing white-space
-        flow_graph_code = "\n".join(line.rstrip() for line in flow_graph_code.split("\n"))
         output.append((self.file_path, flow_graph_code))
 
         return output
@@ -232,7 +252,7 @@ class TopBlockGenerator(object):
 
     def _connections(self):
         fg = self._flow_graph
-        templates = {key: Template(text)
+        templates = {key: get_connection_template(text)
                      for key, text in fg.parent_platform.connection_templates.items()}
 
         def make_port_sig(port):
@@ -249,49 +269,7 @@ class TopBlockGenerator(object):
 
             return '({block}, {key})'.format(block=block, key=key)
 
-        connections = fg.get_enabled_connections()
-
-        # Get the virtual blocks and resolve their connections
-        connection_factory = fg.parent_platform.Connection
-        virtual_source_connections = [c for c in connections if isinstance(c.source_block, blocks.VirtualSource)]
-        for connection in virtual_source_connections:
-            sink = connection.sink_port
-            for source in connection.source_port.resolve_virtual_source():
-                resolved = connection_factory(fg.orignal_flowgraph, source, sink)
-                connections.append(resolved)
-
-        virtual_connections = [c for c in connections if (isinstance(c.source_block, blocks.VirtualSource) or isinstance(c.sink_block, blocks.VirtualSink))]
-        for connection in virtual_connections:
-            # Remove the virtual connection
-            connections.remove(connection)
-
-        # Bypassing blocks: Need to find all the enabled connections for the block using
-        # the *connections* object rather than get_connections(). Create new connections
-        # that bypass the selected block and remove the existing ones. This allows adjacent
-        # bypassed blocks to see the newly created connections to downstream blocks,
-        # allowing them to correctly construct bypass connections.
-        bypassed_blocks = fg.get_bypassed_blocks()
-        for block in bypassed_blocks:
-            # Get the upstream connection (off of the sink ports)
-            # Use *connections* not get_connections()
-            source_connection = [c for c in connections if c.sink_port == block.sinks[0]]
-            # The source connection should never have more than one element.
-            assert (len(source_connection) == 1)
-
-            # Get the source of the connection.
-            source_port = source_connection[0].source_port
-
-            # Loop through all the downstream connections
-            for sink in (c for c in connections if c.source_port == block.sources[0]):
-                if not sink.enabled:
-                    # Ignore disabled connections
-                    continue
-                connection = connection_factory(fg.orignal_flowgraph, source_port, sink.sink_port)
-                connections.append(connection)
-                # Remove this sink connection
-                connections.remove(sink)
-            # Remove the source connection
-            connections.remove(source_connection[0])
+        connections = fg.get_resolved_connections()
 
         # List of connections where each endpoint is enabled (sorted by domains, block names)
         def by_domain_and_blocks(c):
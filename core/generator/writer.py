@@ -0,0 +1,123 @@
+# Copyright 2021 Free Software Foundation, Inc.
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+"""
+Helpers to write generated files
+
+The code is rendered straight to (a temporary file next to) the output file
+instead of being collected in a string first, so the memory used does not
+grow with the size of the generated code.
+
+Files with unchanged contents are not replaced, so their modification time
+stays the same (e.g. for build tools that depend on them). The files of a
+flow graph are replaced together, once all of them were written.
+"""
+
+import contextlib
+import filecmp
+import os
+import shutil
+
+from mako.runtime import Context
+
+
+class StrippedWriter(object):
+    """Pass text on to a file, without the trailing white-space of each line"""
+
+    def __init__(self, fp):
+        self._fp = fp
+        self._line = []  # the parts of the current (unfinished) line
+
+    def write(self, text):
+        if '\n' not in text:
+            self._line.append(text)
+            return
+        first, *lines, last = text.split('\n')
+        self._line.append(first)
+        self._fp.write(''.join(self._line).rstrip())
+        for line in lines:
+            self._fp.write('\n')
+            self._fp.write(line.rstrip())
+        self._fp.write('\n')
+        self._line = [last]
+
+    def close(self):
+        """Write the last line (no newline is added)"""
+        self._fp.write(''.join(self._line).rstrip())
+        self._line = []
+
+
+def render_stripped(template, fp, **kwargs):
+    """
+    Render a mako template to a file, stripping trailing white-space
+
+    Args:
+        template: the mako template
+        fp: the file (or any object with a write method) to render to
+        kwargs: the template arguments
+    """
+    writer = StrippedWriter(fp)
+    template.render_context(Context(writer, **kwargs))
+    writer.close()
+
+
+@contextlib.contextmanager
+def atomic_outputs(changed_files=None):
+    """
+    Write several files, which are replaced once the block exits without an error
+
+    A file is only replaced if its contents differ, otherwise the file is left
+    as it was. A replaced file keeps its permissions unless a mode is given.
+
+    Args:
+        changed_files: a list to add the filenames to, that were replaced
+
+    Yields:
+        a function output(filename, mode=None), giving a context manager that
+        yields the (buffered) text file to write the contents of filename to
+    """
+    pending = []  # (temp file, filename, mode) of the files written
+
+    @contextlib.contextmanager
+    def output(filename, mode=None):
+        temp_file = '{}.{}.{}.tmp'.format(filename, os.getpid(), len(pending))
+        pending.append((temp_file, filename, mode))
+        with open(temp_file, 'w', encoding='utf-8', newline='') as fp:
+            yield fp
+
+    try:
+        yield output
+        for temp_file, filename, mode in pending:
+            exists = os.path.isfile(filename)
+            if not (exists and filecmp.cmp(temp_file, filename, shallow=False)):
+                if mode is None and exists:
+                    shutil.copymode(filename, temp_file)
+                os.replace(temp_file, filename)
+                if changed_files is not None:
+                    changed_files.append(filename)
+            if mode is not None:
+                os.chmod(filename, mode)
+    finally:
+        for temp_file, _, _ in pending:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+
+@contextlib.contextmanager
+def atomic_output(filename, mode=None, changed_files=None):
+    """
+    Open a temporary file to write the contents of a file to (see atomic_outputs)
+
+    Args:
+        filename: the file to write
+        mode: the permissions of the file (optional)
+        changed_files: a list to add the filename to, if it was replaced
+
+    Yields:
+        a (buffered) text file
+    """
+    with atomic_outputs(changed_files) as output:
+        with output(filename, mode) as fp:
+            yield fp
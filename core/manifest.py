@@ -0,0 +1,193 @@
+# Copyright 2021 Free Software Foundation, Inc.
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+"""
+Build manifest of generated flow graphs
+
+For each generated flow graph the manifest records content hashes of its
+inputs (the .grc file, the block descriptions of the blocks used, the .grc
+sources of hier blocks and the generator inputs: domain connection templates,
+flow graph templates and the GRC code) and of the generated files. If none of
+these changed, generating the flow graph again would give the same output.
+
+Concurrent runs share the manifest file: on save, the entries changed by this
+run are merged into the current file content under a file lock.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+from .utils.file_lock import locked
+
+logger = logging.getLogger(__name__)
+
+CORE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def file_hash(filename):
+    """Get the hex digest of a file content (None if not readable)"""
+    digest = hashlib.sha256()
+    try:
+        with open(filename, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1 << 16), b''):
+                digest.update(chunk)
+    except (IOError, OSError):
+        return None
+    return digest.hexdigest()
+
+
+def _files_hash(directory, extension):
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(name for name in dirs if name != '__pycache__')
+        for filename in sorted(files):
+            if filename.endswith(extension):
+                path = os.path.join(root, filename)
+                digest.update('{}\n{}\n'.format(
+                    os.path.relpath(path, directory), file_hash(path)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def generator_inputs(*connection_templates):
+    """
+    Get the digests of the generator inputs, which are not part of a flow graph
+
+    Args:
+        connection_templates: dicts of (source domain, sink domain) -> template
+
+    Returns:
+        a dict of input name -> digest
+    """
+    templates = [sorted(templates.items()) for templates in connection_templates]
+    return {
+        'connection_templates': hashlib.sha256(repr(templates).encode('utf-8')).hexdigest(),
+        'flow_graph_templates': _files_hash(CORE_DIR, '.mako'),
+        'code': _files_hash(CORE_DIR, '.py'),
+    }
+
+
+class BuildManifest(object):
+
+    FORMAT_VERSION = 2
+
+    def __init__(self, filename, version):
+        self.manifest_file = filename
+        self.version = str(version)
+        self._entries = {}
+        self._changed = set()  # keys set or discarded since the last load/save
+        self.need_manifest_write = False
+
+    @staticmethod
+    def _key(grc_file, out_dir):
+        return '{}\n{}'.format(os.path.abspath(grc_file), out_dir and os.path.abspath(out_dir))
+
+    def _read_entries(self):
+        try:
+            with open(self.manifest_file, encoding='utf-8') as fp:
+                data = json.load(fp)
+            if data.get('format') != self.FORMAT_VERSION:
+                raise ValueError('Unknown build manifest format')
+            return dict(data['entries'])
+        except (IOError, ValueError, KeyError, AttributeError, TypeError):
+            return {}
+
+    def load(self):
+        self._entries = self._read_entries()
+        self._changed.clear()
+
+    def save(self):
+        """Merge the entries changed since the last load into the manifest file"""
+        if not self.need_manifest_write:
+            return
+        temp_file = '{}.{}.tmp'.format(self.manifest_file, os.getpid())
+        try:
+            with locked(self.manifest_file):
+                entries = self._read_entries()  # including those of concurrent runs
+                for key in self._changed:
+                    if key in self._entries:
+                        entries[key] = self._entries[key]
+                    else:
+                        entries.pop(key, None)
+                with open(temp_file, 'w', encoding='utf-8') as fp:
+                    json.dump({'format': self.FORMAT_VERSION, 'entries': entries}, fp)
+                os.replace(temp_file, self.manifest_file)
+            self._entries = entries
+            self._changed.clear()
+            self.need_manifest_write = False
+        except (IOError, OSError) as error:
+            logger.warning(f"Failed to save build manifest {self.manifest_file}: {error}")
+
+    def get_entry(self, grc_file, out_dir):
+        return self._entries.get(self._key(grc_file, out_dir))
+
+    def set_entry(self, grc_file, out_dir, entry):
+        key = self._key(grc_file, out_dir)
+        self._entries[key] = entry
+        self._changed.add(key)
+        self.need_manifest_write = True
+
+    def discard(self, grc_file, out_dir):
+        """Forget a flow graph, so it is generated again"""
+        key = self._key(grc_file, out_dir)
+        if self._entries.pop(key, None):
+            self._changed.add(key)
+            self.need_manifest_write = True
+
+    def record(self, grc_file, out_dir, file_path, block_sources, grc_sources, output_files,
+               generator_inputs):
+        """
+        Record the inputs and outputs of a generated flow graph
+
+        Args:
+            grc_file: the flow graph file
+            out_dir: the output directory it was generated for
+            file_path: the path of the generated flow graph
+            block_sources: dict of block id -> description file (or None) of all blocks used
+            grc_sources: the .grc files of hier blocks used
+            output_files: the paths of all generated files
+            generator_inputs: the digests of the generator inputs (see generator_inputs())
+        """
+        self.set_entry(grc_file, out_dir, {
+            'version': self.version,
+            'file_path': file_path,
+            'grc': file_hash(grc_file),
+            'generator': generator_inputs,
+            'blocks': {block_id: [path, file_hash(path) if path and os.path.isfile(path) else None]
+                       for block_id, path in block_sources.items()},
+            'grc_sources': {path: file_hash(path) for path in grc_sources},
+            'outputs': {path: file_hash(path) for path in output_files},
+        })
+
+    def get_up_to_date_output(self, grc_file, out_dir, block_source, generator_inputs):
+        """
+        Check if a flow graph needs to be generated again
+
+        Args:
+            grc_file: the flow graph file
+            out_dir: the output directory
+            block_source: callable giving the description file of a block id
+            generator_inputs: the current digests of the generator inputs
+
+        Returns:
+            the path of the generated flow graph if it is up to date, else None
+        """
+        entry = self.get_entry(grc_file, out_dir)
+        if not entry or entry['version'] != self.version:
+            return None
+        if entry['generator'] != generator_inputs:
+            return None
+        if file_hash(grc_file) != entry['grc']:
+            return None
+        for block_id, (path, digest) in entry['blocks'].items():
+            if block_source(block_id) != path:
+                return None  # block is loaded from another file now
+            if digest is not None and file_hash(path) != digest:
+                return None
+        files = dict(entry['grc_sources'], **entry['outputs'])
+        if any(digest is None or file_hash(path) != digest for path, digest in files.items()):
+            return None
+        return entry['file_path']
@@ -48,11 +48,11 @@ def validate_block_id(param,black_listed_ids):
         not getattr(param.parent_block, 'exempt_from_id_validation', False):
         # Grant blacklist exemption to epy blocks and modules
         raise ValidateError('ID "{}" is blacklisted.'.format(value))
-    block_names = [block.name for block in param.parent_flowgraph.iter_enabled_blocks()]
+    count = param.parent_flowgraph.count_enabled_blocks(value)
     # Id should only appear once, or zero times if block is disabled
-    if param.key == 'id' and block_names.count(value) > 1:
+    if param.key == 'id' and count > 1:
         raise ValidateError('ID "{}" is not unique.'.format(value))
-    elif value not in block_names:
+    elif not count:
         raise ValidateError('ID "{}" does not exist.'.format(value))
     return value
 
@@ -73,17 +73,13 @@ def validate_name(param,black_listed_ids):
 @validates('stream_id')
 def validate_stream_id(param,black_listed_ids):
     value = param.value
-    stream_ids = [
-        block.params['stream_id'].value
-        for block in param.parent_flowgraph.iter_enabled_blocks()
-        if isinstance(block, blocks.VirtualSink)
-    ]
+    virtual_sinks = param.parent_flowgraph.get_virtual_port_table().sinks.get(value, ())
     # Check that the virtual sink's stream id is unique
-    if isinstance(param.parent_block, blocks.VirtualSink) and stream_ids.count(value) >= 2:
+    if isinstance(param.parent_block, blocks.VirtualSink) and len(virtual_sinks) >= 2:
         # Id should only appear once, or zero times if block is disabled
         raise ValidateError('Stream ID "{}" is not unique.'.format(value))
     # Check that the virtual source's steam id is found
-    elif isinstance(param.parent_block, blocks.VirtualSource) and value not in stream_ids:
+    elif isinstance(param.parent_block, blocks.VirtualSource) and not virtual_sinks:
         raise ValidateError('Stream ID "{}" is not found.'.format(value))
 
 
@@ -11,6 +11,7 @@ import textwrap
 
 from .. import Constants
 from ..base import Element
+from ..utils import import_cache
 from ..utils.descriptors import Evaluated, EvaluatedEnum, setup_names
 
 from . import dtypes
@@ -103,6 +104,27 @@ class Param(Element):
     def template_arg(self):
         return TemplateArg(self)
 
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        old_value = self.__dict__.get('_value')
+        self._value = value
+        self._changed()
+        self.mark_dirty()
+        if self.key == 'id' and old_value is not None and value != old_value:
+            flow_graph = self.parent_flowgraph
+            if flow_graph is not None:
+                flow_graph.block_name_changed(self.parent_block, old_value)
+
+    def _changed(self):
+        """Let the block know that the code of its params may have changed"""
+        block = self.parent
+        if block is not None:
+            block.params_revision += 1
+
     def __str__(self):
         return 'Param - {}({})'.format(self.name, self.key)
 
@@ -133,6 +155,7 @@ class Param(Element):
         del self.name
         del self.dtype
         del self.hide
+        self._changed()
 
         self._evaluated = None
         try:
@@ -266,7 +289,7 @@ class Param(Element):
             # New namespace
             n = dict()
             try:
-                exec(expr, n)
+                import_cache.exec_imports(expr, n)
             except ImportError:
                 raise Exception('Import "{}" failed.'.format(expr))
             except Exception:
@@ -7,8 +7,10 @@
 
 from codecs import open
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import os
 import logging
+import pickle
 from itertools import chain
 import re
 
@@ -19,37 +21,82 @@ from . import (
 
 from .Config import Config
 from .cache import Cache
+from .manifest import file_hash, generator_inputs
+from .snapshot import LibrarySnapshot, make_key as make_snapshot_key
 from .base import Element
 from .io import yaml
-from .generator import Generator
+from .generator import Generator, precompile_templates as precompile_generator_templates
 from .FlowGraph import FlowGraph
 from .Connection import Connection
 
 logger = logging.getLogger(__name__)
 
 
+def _parse_and_check_description(file_path, scheme):
+    """Parse and schema-check a description file (runs in a worker process)"""
+    with open(file_path, encoding='utf-8') as fp:
+        data = yaml.safe_load(fp)
+    checker = schema_checker.Validator(scheme)
+    passed = checker.run(data)
+    return data, checker.messages, passed
+
+
+def _log_schema_check(file_path, messages, passed):
+    for msg in messages:
+        logger.warning('{:<40s} {}'.format(os.path.basename(file_path), msg))
+    if not passed:
+        logger.info('YAML schema check failed for: ' + file_path)
+
+
 class Platform(Element):
 
-    def __init__(self, *args, **kwargs):
-        """ Make a platform for GNU Radio """
+    def __init__(self, *args, headless=False, lazy_blocks=None, **kwargs):
+        """
+        Make a platform for GNU Radio
+
+        Args:
+            headless: skip work only needed for the GUI (docstring extraction),
+                      e.g. for grcc and library users
+            lazy_blocks: only index the block descriptions when building the
+                         library, block classes are built on first access
+                         (defaults to headless)
+        """
         Element.__init__(self, parent=None)
 
         self.config = self.Config(*args, **kwargs)
         self.block_docstrings = {}
         self.block_docstrings_loaded_callback = lambda: None  # dummy to be replaced by BlockTreeWindow
 
-        self._docstring_extractor = utils.extract_docs.SubprocessLoader(
-            callback_query_result=self._save_docstring_extraction_result,
-            callback_finished=lambda: self.block_docstrings_loaded_callback()
-        )
+        self.headless = headless
+        if headless:
+            self._docstring_extractor = None
+        else:
+            self._docstring_extractor = utils.extract_docs.SubprocessLoader(
+                callback_query_result=self._save_docstring_extraction_result,
+                callback_finished=lambda: self.block_docstrings_loaded_callback(),
+                cache_file=Constants.DOCSTRING_CACHE_FILE,
+                workers=self.config.docstring_extraction_workers,
+            )
 
+        if lazy_blocks is None:
+            lazy_blocks = headless
+        self._lazy_blocks = lazy_blocks
+        if lazy_blocks:
+            self.block_classes = utils.backports.ChainMap(
+                blocks.LazyBlockRegistry(self._build_block_from_stub),
+                self.block_classes_build_in
+            )
         self.blocks = self.block_classes
         self.domains = {}
         self.connection_templates = {}
         self.cpp_connection_templates = {}
+        self._generator_inputs = None
+        self._stub_cache = None  # block cache used to build lazy blocks
 
         self._block_categories = {}
         self._auto_hier_block_generate_chain = set()
+        # (.grc file, content hash) -> generated file, set for a run of grcc
+        self.generated_hier_blocks = None
 
         if not yaml.__with_libyaml__:
             logger.warning("Slow YAML loading (libyaml not available)")
@@ -73,8 +120,43 @@ class Platform(Element):
             if os.path.exists(os.path.normpath(file_path)):
                 return file_path
 
-    def load_and_generate_flow_graph(self, file_path, out_dir=None, hier_only=False):
-        """Loads a flow graph from file and generates it"""
+    def load_and_generate_flow_graph(self, file_path, out_dir=None, hier_only=False, manifest=None):
+        """
+        Loads a flow graph from file and generates it
+
+        If a build manifest is given, nothing is done if the flow graph, the
+        blocks it uses and the generated files are unchanged since they were
+        recorded. In that case no flow graph is returned.
+
+        If generated_hier_blocks is set (a dict for one run of grcc), hier
+        blocks (hier_only) are generated once per content of their file, later
+        calls return the file generated before (and no flow graph). Failures
+        are not remembered.
+        """
+        memo = self.generated_hier_blocks
+        if not hier_only or memo is None:
+            return self._load_and_generate_flow_graph(file_path, out_dir, hier_only, manifest)
+
+        memo_key = os.path.abspath(file_path), file_hash(file_path)
+        generated_file_path = memo.get(memo_key)
+        if generated_file_path and os.path.exists(generated_file_path):
+            return None, generated_file_path
+        flow_graph, generated_file_path = self._load_and_generate_flow_graph(
+            file_path, out_dir, hier_only, manifest)
+        if generated_file_path:
+            memo[memo_key] = generated_file_path
+        else:
+            memo.pop(memo_key, None)
+        return flow_graph, generated_file_path
+
+    def _load_and_generate_flow_graph(self, file_path, out_dir, hier_only, manifest):
+        if manifest:
+            generated_file_path = manifest.get_up_to_date_output(
+                file_path, out_dir, self.get_block_source, self.get_generator_inputs())
+            if generated_file_path:
+                Messages.send('>>> Up to date: {}\n'.format(generated_file_path))
+                return None, generated_file_path
+
         Messages.set_indent(len(self._auto_hier_block_generate_chain))
         Messages.send('>>> Loading: {}\n'.format(file_path))
         if file_path in self._auto_hier_block_generate_chain:
@@ -107,59 +189,177 @@ class Platform(Element):
                 generator = self.Generator(flow_graph, out_dir or file_path)
             Messages.send('>>> Generating: {}\n'.format(generator.file_path))
             generator.write()
+            utils.import_cache.clear(failures_only=True)  # the new module may be imported now
         except Exception as e:
             Messages.send('>>> Generate Error: {}: {}\n'.format(file_path, str(e)))
             return None, None
 
+        flow_graph.generated_files = {
+            output_file: output_file in generator.changed_files
+            for output_file in generator.output_files}
+        for output_file, changed in flow_graph.generated_files.items():
+            Messages.send('    {} {}\n'.format('Changed:  ' if changed else 'Unchanged:', output_file))
+
+        if manifest:
+            manifest.record(
+                file_path, out_dir, generator.file_path,
+                block_sources={block.key: self.get_block_source(block.key) for block in flow_graph.blocks},
+                grc_sources={block.extra_data['grc_source'] for block in flow_graph.blocks
+                             if block.extra_data.get('grc_source')},
+                output_files=generator.output_files,
+                generator_inputs=self.get_generator_inputs(),
+            )
         return flow_graph, generator.file_path
 
-    def build_library(self, path=None):
+    def find_hier_block_dependencies(self, file_path):
+        """
+        Find the .grc files of the hier blocks used by a flow graph, which
+        are not in the library (see FlowGraph._build_depending_hier_block)
+
+        Args:
+            file_path: the flow graph file
+
+        Returns:
+            a list of .grc files
+        """
+        data = self.parse_flow_graph(file_path, quiet=True)
+        options = data.get('options', {}).get('parameters', {})
+        paths = options.get('hier_block_src_path', '.:')
+        dependencies = []
+        for block_data in data.get('blocks', []):
+            block_id = block_data['id']
+            if block_id in self.blocks:
+                continue
+            dependency = self.find_file_in_paths(block_id + '.grc', paths, file_path)
+            if dependency:
+                dependencies.append(os.path.abspath(dependency))
+        return dependencies
+
+    def hier_block_build_order(self, grc_files):
+        """
+        Get the hier blocks the flow graphs depend on, in the order they can be
+        generated in. The graph is walked without loading any flow graph.
+
+        Args:
+            grc_files: the flow graph files
+
+        Returns:
+            a list of layers (lists of .grc files), the files of a layer only
+            depend on files of earlier layers
+        """
+        dependencies = {}
+        pending = [os.path.abspath(grc_file) for grc_file in grc_files]
+        while pending:
+            file_path = pending.pop()
+            if file_path in dependencies:
+                continue
+            try:
+                dependencies[file_path] = self.find_hier_block_dependencies(file_path)
+            except Exception as error:
+                logger.debug('Failed to parse %s: %s', file_path, error)
+                dependencies[file_path] = []
+            pending.extend(dependencies[file_path])
+
+        roots = {os.path.abspath(grc_file) for grc_file in grc_files}
+        remaining = {file_path: set(deps) for file_path, deps in dependencies.items()
+                     if file_path not in roots}
+        for deps in remaining.values():
+            deps.intersection_update(remaining)
+
+        layers = []
+        while remaining:
+            layer = sorted(file_path for file_path, deps in remaining.items() if not deps)
+            if not layer:  # cyclic, reported when loading the flow graphs
+                break
+            layers.append(layer)
+            for file_path in layer:
+                del remaining[file_path]
+            for deps in remaining.values():
+                deps.difference_update(layer)
+        return layers
+
+    def get_block_source(self, block_id):
+        """Get the description file of a block (without building lazy blocks)"""
+        if self._lazy_blocks and block_id in self.blocks.maps[0]:
+            return self.blocks.maps[0].peek(block_id).loaded_from
+        block = self.blocks.get(block_id)
+        return block.loaded_from if block else None
+
+    def precompile_templates(self, block_ids=None):
+        """
+        Compile the templates once for all processes using this library
+
+        A new (eager) library is precompiled when it is built. With lazy blocks
+        (e.g. grcc) the batch compile precompiles the blocks it will use.
+
+        Args:
+            block_ids: the blocks to compile the templates of (lazy ones are
+                       built), defaults to all blocks of an eager library
+        """
+        if block_ids is None:
+            block_ids = () if self._lazy_blocks else list(self.blocks.maps[0])
+        block_classes = []
+        for key in block_ids:
+            try:
+                block_classes.append(self.blocks[key])
+            except KeyError:
+                pass  # not in the library (e.g. a hier block) or broken
+        blocks.MakoTemplates.precompile(
+            templates for block in block_classes
+            for templates in (block.templates, getattr(block, 'cpp_templates', {})))
+        utils.template_cache.precompile(filter(None, chain(
+            self.connection_templates.values(), self.cpp_connection_templates.values())))
+        precompile_generator_templates()
+
+    def get_generator_inputs(self):
+        """Get the digests of the generator inputs for a build manifest (computed once per library)"""
+        if self._generator_inputs is None:
+            self._generator_inputs = generator_inputs(
+                self.connection_templates, self.cpp_connection_templates)
+        return self._generator_inputs
+
+    def build_library(self, path=None, processes=None):
         """load the blocks and block tree from the search paths
 
         path: a list of paths/files to search in or load (defaults to config)
-        """
-        self._docstring_extractor.start()
+        processes: number of worker processes used to parse and schema-check
+                   description files missing from the cache (defaults to config)
 
+        If no description file changed since the last (error-free) load, the
+        library is restored from a snapshot instead. Only an eager load (e.g.
+        the GUI) saves a snapshot, a library with lazy blocks (e.g. grcc) uses
+        it but never builds all block classes to make one.
+        """
         # Reset
+        utils.import_cache.clear()
+        if self._stub_cache:
+            self._stub_cache.close()
+            self._stub_cache = None
+        if self.generated_hier_blocks is not None:
+            self.generated_hier_blocks.clear()
         self.blocks.clear()
         self.domains.clear()
         self.connection_templates.clear()
         self.cpp_connection_templates.clear()
+        self._generator_inputs = None
         self._block_categories.clear()
-        
-        with Cache(Constants.CACHE_FILE, version = self.config.version) as cache:
-            for file_path in self._iter_files_in_block_path(path):
-
-                if file_path.endswith('.block.yml'):
-                    loader = self.load_block_description
-                    scheme = schema_checker.BLOCK_SCHEME
-                elif file_path.endswith('.domain.yml'):
-                    loader = self.load_domain_description
-                    scheme = schema_checker.DOMAIN_SCHEME
-                elif file_path.endswith('.tree.yml'):
-                    loader = self.load_category_tree_description
-                    scheme = None
-                else:
-                    continue
 
-                try:
-                    checker = schema_checker.Validator(scheme)
-                    data = cache.get_or_load(file_path)
-                    passed = checker.run(data)
-                    for msg in checker.messages:
-                        logger.warning('{:<40s} {}'.format(os.path.basename(file_path), msg))
-                    if not passed:
-                        logger.info('YAML schema check failed for: ' + file_path)
+        files = list(self._iter_files_in_block_path(path))
+        snapshot = LibrarySnapshot(Constants.LIBRARY_SNAPSHOT_FILE, make_snapshot_key(
+            self.config.version, path or self.config.block_paths, files))
 
-                    loader(data, file_path)
-                except Exception as error:
-                    logger.exception('Error while loading %s', file_path)
-                    logger.exception(error)
-                    Messages.flowgraph_error = error
-                    Messages.flowgraph_error_file = file_path
-                    continue
+        state = snapshot.load()
+        if state:
+            self._restore_library_state(state)
+        elif self._load_descriptions(files, processes) and not self._lazy_blocks:
+            snapshot.save(self._dump_library_state())
+            self.precompile_templates()
 
-        for key, block in self.blocks.items():
+        if self._lazy_blocks:
+            entries = chain(self.blocks.maps[0].entries(), self.block_classes_build_in.items())
+        else:
+            entries = self.blocks.items()
+        for key, block in entries:
             category = self._block_categories.get(key, block.category)
             if not category:
                 continue
@@ -170,8 +370,9 @@ class Platform(Element):
                 category.insert(0, Constants.DEFAULT_BLOCK_MODULE_NAME)
             block.category = category
 
-        self._docstring_extractor.finish()
-        # self._docstring_extractor.wait()
+        if self._docstring_extractor:
+            self._docstring_extractor.finish()
+            # self._docstring_extractor.wait()
         if 'options' not in self.blocks:
             # we didn't find one of the built-in blocks ("options")
             # which probably means the GRC blocks path is bad
@@ -186,6 +387,71 @@ class Platform(Element):
             # might have some cleanup to do on the options block in particular
             utils.hide_bokeh_gui_options_if_not_installed(self.blocks['options'])
 
+    def _load_descriptions(self, files, processes=None):
+        """
+        Parse, check and load the description files
+
+        Returns:
+            True if all files were loaded without errors
+        """
+        if processes is None:
+            processes = self.config.block_load_processes
+
+        success = True
+        with Cache(Constants.CACHE_FILE, version = self.config.version) as cache:
+            descriptions = []
+            for file_path in files:
+                loader, scheme = self._get_description_handlers(file_path)
+                if loader:
+                    descriptions.append((file_path, loader, scheme))
+
+            parsed = self._parse_descriptions_in_pool(descriptions, cache, processes)
+
+            # loaders are always called in path order to keep the override order
+            for file_path, loader, scheme in descriptions:
+                try:
+                    if file_path in parsed:
+                        data, messages, passed = parsed[file_path].result()
+                        cache.store(file_path, data)
+                    else:
+                        data = cache.get_or_load(file_path)
+                        checker = schema_checker.Validator(scheme)
+                        passed = checker.run(data)
+                        messages = checker.messages
+                    _log_schema_check(file_path, messages, passed)
+
+                    loader(data, file_path)
+                except Exception as error:
+                    logger.exception('Error while loading %s', file_path)
+                    logger.exception(error)
+                    Messages.flowgraph_error = error
+                    Messages.flowgraph_error_file = file_path
+                    success = False
+                    continue
+        return success
+
+    def _dump_library_state(self):
+        return dict(
+            blocks=[(block.key, block.label, list(block.category), block.loaded_from,
+                     pickle.dumps(blocks.dump(block), pickle.HIGHEST_PROTOCOL))
+                    for block in self.blocks.maps[0].values()],
+            domains={key: tuple(domain) for key, domain in self.domains.items()},
+            connection_templates=self.connection_templates,
+            cpp_connection_templates=self.cpp_connection_templates,
+            block_categories=self._block_categories,
+        )
+
+    def _restore_library_state(self, state):
+        for key, label, category, loaded_from, block_state in state['blocks']:
+            if self._lazy_blocks:
+                self.blocks.maps[0].add_stub(key, label, category, loaded_from, block_state)
+                continue
+            block_cls = self.blocks[key] = self.restore_block_class(pickle.loads(block_state))
+            self._query_docstrings(block_cls)
+        self.domains.update((key, self.Domain(*domain)) for key, domain in state['domains'].items())
+        self.connection_templates.update(state['connection_templates'])
+        self.cpp_connection_templates.update(state['cpp_connection_templates'])
+        self._block_categories.update(state['block_categories'])
 
     def _iter_files_in_block_path(self, path=None, ext='yml'):
         """Iterator for block descriptions and category trees"""
@@ -199,6 +465,45 @@ class Platform(Element):
             else:
                 logger.debug('Ignoring invalid path entry %r', entry)
 
+    def _get_description_handlers(self, file_path):
+        """Get the loader and schema for a description file (or None, None)"""
+        if file_path.endswith('.block.yml'):
+            if self._lazy_blocks:  # checked when the block class is built
+                return self.index_block_description, None
+            return self.load_block_description, schema_checker.BLOCK_SCHEME
+        elif file_path.endswith('.domain.yml'):
+            return self.load_domain_description, schema_checker.DOMAIN_SCHEME
+        elif file_path.endswith('.tree.yml'):
+            return self.load_category_tree_description, None
+        return None, None
+
+    def _parse_descriptions_in_pool(self, descriptions, cache, processes):
+        """
+        Parse and schema-check the description files missing from the cache
+        using a pool of worker processes.
+
+        Returns:
+            a dict of file path -> future of (data, messages, passed)
+        """
+        if processes <= 1:
+            return {}
+        pending = [(file_path, scheme) for file_path, _, scheme in descriptions
+                   if not cache.is_cached(file_path)]
+        if len(pending) < 2:
+            return {}
+
+        logger.debug('Parsing %d description files using %d processes',
+                     len(pending), processes)
+        with ProcessPoolExecutor(max_workers=min(processes, len(pending))) as executor:
+            return {file_path: executor.submit(_parse_and_check_description, file_path, scheme)
+                    for file_path, scheme in pending}
+
+    def _query_docstrings(self, block_cls):
+        if self._docstring_extractor:
+            self._docstring_extractor.query(
+                block_cls.key, block_cls.templates['imports'], block_cls.templates['make'],
+            )
+
     def _save_docstring_extraction_result(self, block_id, docstrings):
         docs = {}
         for match, docstring in docstrings.items():
@@ -240,10 +545,63 @@ class Platform(Element):
             log.exception(error)
             return
 
-        self._docstring_extractor.query(
-            block_id, block_cls.templates['imports'], block_cls.templates['make'],
+        self._query_docstrings(block_cls)
+
+    def index_block_description(self, data, file_path):
+        """Add a stub for a block description to the lazy block registry"""
+        log = logger.getChild('block_loader')
+
+        file_format = data['file_format']
+        if file_format < 1 or file_format > Constants.BLOCK_DESCRIPTION_FILE_FORMAT_VERSION:
+            log.error('Unknown format version %d in %s', file_format, file_path)
+            return
+
+        block_id = data['id'].rstrip('_')
+        registry = self.blocks.maps[0]
+
+        if block_id in self.block_classes_build_in:
+            log.warning('Not overwriting build-in block %s with %s', block_id, file_path)
+            return
+        if block_id in registry:
+            log.warning('Block with id "%s" loaded from\n  %s\noverwritten by\n  %s',
+                        block_id, registry.peek(block_id).loaded_from, file_path)
+
+        category = data.get('category', '')
+        registry.add_stub(
+            key=block_id,
+            label=data.get('label', '') or block_id.title(),
+            category=[cat.strip() for cat in category.split('/') if cat.strip()],
+            loaded_from=file_path,
         )
 
+    def _build_block_from_stub(self, stub):
+        """Build the class of a block indexed by the lazy block registry (or None)"""
+        log = logger.getChild('block_loader')
+        try:
+            if stub.state:
+                block_cls = self.restore_block_class(pickle.loads(stub.state))
+            else:
+                if self._stub_cache is None:  # opened once, not for every block
+                    self._stub_cache = Cache(Constants.CACHE_FILE, version=self.config.version)
+                    self._stub_cache.load()
+                data = self._stub_cache.get_or_load(stub.loaded_from)
+                if self._stub_cache.need_cache_write:  # changed since the library was built
+                    self._stub_cache.close()
+                    self._stub_cache = None
+                checker = schema_checker.Validator(schema_checker.BLOCK_SCHEME)
+                passed = checker.run(data)
+                _log_schema_check(stub.loaded_from, checker.messages, passed)
+                data['id'] = stub.key
+                block_cls = self.new_block_class(**data)
+                block_cls.loaded_from = stub.loaded_from
+        except Exception as error:
+            log.error('Unable to load block %s', stub.key)
+            log.exception(error)
+            return None
+
+        block_cls.category = stub.category
+        return block_cls
+
     def load_domain_description(self, data, file_path):
         log = logger.getChild('domain_loader')
         domain_id = data['id']
@@ -306,13 +664,14 @@ class Platform(Element):
     ##############################################
     # Access
     ##############################################
-    def parse_flow_graph(self, filename):
+    def parse_flow_graph(self, filename, quiet=False):
         """
         Parse a saved flow graph file.
         Ensure that the file exists, and passes the dtd check.
 
         Args:
             filename: the flow graph file
+            quiet: don't send a message when converting from XML
 
         Returns:
             nested data
@@ -330,7 +689,8 @@ class Platform(Element):
                 validator.run(data)
 
         if is_xml:
-            Messages.send('>>> Converting from XML\n')
+            if not quiet:
+                Messages.send('>>> Converting from XML\n')
             from ..converter.flow_graph import from_xml
             data = from_xml(filename)
 
@@ -414,6 +774,9 @@ class Platform(Element):
     def new_block_class(self, **data):
         return blocks.build(**data)
 
+    def restore_block_class(self, state):
+        return blocks.restore(state)
+
     def make_block(self, parent, block_id, **kwargs):
         cls = self.block_classes[block_id]
         return cls(parent, **kwargs)
@@ -5,6 +5,7 @@
 # 
 
 
+import collections
 from itertools import chain
 
 from .. import blocks
@@ -15,100 +16,111 @@ class LoopError(Exception):
 
 
 def upstream_ports(port):
+    table = port.parent_flowgraph.get_virtual_port_table()
     if port.is_sink:
-        return _sources_from_virtual_sink_port(port)
+        return table.sources_from_virtual_sink_port(port)
     else:
-        return _sources_from_virtual_source_port(port)
-
-
-def _sources_from_virtual_sink_port(sink_port, _traversed=None):
-    """
-    Resolve the source port that is connected to the given virtual sink port.
-    Use the get source from virtual source to recursively resolve subsequent ports.
-    """
-    source_ports_per_virtual_connection = (
-        # there can be multiple ports per virtual connection
-        _sources_from_virtual_source_port(c.source_port, _traversed)  # type: list
-        for c in sink_port.connections(enabled=True)
-    )
-    return list(chain(*source_ports_per_virtual_connection))  # concatenate generated lists of ports
-
-
-def _sources_from_virtual_source_port(source_port, _traversed=None):
-    """
-    Recursively resolve source ports over the virtual connections.
-    Keep track of traversed sources to avoid recursive loops.
-    """
-    _traversed = set(_traversed or [])  # a new set!
-    if source_port in _traversed:
-        raise LoopError('Loop found when resolving port type')
-    _traversed.add(source_port)
-
-    block = source_port.parent_block
-    flow_graph = source_port.parent_flowgraph
-
-    if not isinstance(block, blocks.VirtualSource):
-        return [source_port]  # nothing to resolve, we're done
-
-    stream_id = block.params['stream_id'].value
-
-    # currently the validation does not allow multiple virtual sinks and one virtual source
-    # but in the future it may...
-    connected_virtual_sink_blocks = (
-        b for b in flow_graph.iter_enabled_blocks()
-        if isinstance(b, blocks.VirtualSink) and b.params['stream_id'].value == stream_id
-    )
-    source_ports_per_virtual_connection = (
-        _sources_from_virtual_sink_port(b.sinks[0], _traversed)  # type: list
-        for b in connected_virtual_sink_blocks
-    )
-    return list(chain(*source_ports_per_virtual_connection))  # concatenate generated lists of ports
+        return list(table.sources_from_virtual_source_port(port))
 
 
 def downstream_ports(port):
+    table = port.parent_flowgraph.get_virtual_port_table()
     if port.is_source:
-        return _sinks_from_virtual_source_port(port)
+        return table.sinks_from_virtual_source_port(port)
     else:
-        return _sinks_from_virtual_sink_port(port)
+        return list(table.sinks_from_virtual_sink_port(port))
 
 
-def _sinks_from_virtual_source_port(source_port, _traversed=None):
+class VirtualPortTable(object):
     """
-    Resolve the sink port that is connected to the given virtual source port.
-    Use the get sink from virtual sink to recursively resolve subsequent ports.
-    """
-    sink_ports_per_virtual_connection = (
-        # there can be multiple ports per virtual connection
-        _sinks_from_virtual_sink_port(c.sink_port, _traversed)  # type: list
-        for c in source_port.connections(enabled=True)
-    )
-    return list(chain(*sink_ports_per_virtual_connection))  # concatenate generated lists of ports
-
+    The enabled virtual sinks and sources of a flow graph by stream id, and
+    the ports resolved over the virtual connections so far.
 
-def _sinks_from_virtual_sink_port(sink_port, _traversed=None):
+    Only valid as long as the blocks and connections don't change.
     """
-    Recursively resolve sink ports over the virtual connections.
-    Keep track of traversed sinks to avoid recursive loops.
-    """
-    _traversed = set(_traversed or [])  # a new set!
-    if sink_port in _traversed:
-        raise LoopError('Loop found when resolving port type')
-    _traversed.add(sink_port)
-
-    block = sink_port.parent_block
-    flow_graph = sink_port.parent_flowgraph
-
-    if not isinstance(block, blocks.VirtualSink):
-        return [sink_port]
-
-    stream_id = block.params['stream_id'].value
-
-    connected_virtual_source_blocks = (
-        b for b in flow_graph.iter_enabled_blocks()
-        if isinstance(b, blocks.VirtualSource) and b.params['stream_id'].value == stream_id
-    )
-    sink_ports_per_virtual_connection = (
-        _sinks_from_virtual_source_port(b.sources[0], _traversed)  # type: list
-        for b in connected_virtual_source_blocks
-    )
-    return list(chain(*sink_ports_per_virtual_connection))  # concatenate generated lists of ports
+
+    def __init__(self, flow_graph):
+        self.connections_version = flow_graph.connections.version
+        self.sinks = collections.defaultdict(list)  # stream id -> virtual sink blocks
+        self.sources = collections.defaultdict(list)  # stream id -> virtual source blocks
+        for block in flow_graph.iter_enabled_blocks():
+            if isinstance(block, blocks.VirtualSink):
+                self.sinks[block.stream_id].append(block)
+            elif isinstance(block, blocks.VirtualSource):
+                self.sources[block.stream_id].append(block)
+        self._upstream = {}  # virtual source port -> source ports (None while resolving)
+        self._downstream = {}  # virtual sink port -> sink ports (None while resolving)
+
+    def sources_from_virtual_sink_port(self, sink_port):
+        """
+        Resolve the source port that is connected to the given virtual sink port.
+        Use the get source from virtual source to recursively resolve subsequent ports.
+        """
+        source_ports_per_virtual_connection = (
+            # there can be multiple ports per virtual connection
+            self.sources_from_virtual_source_port(c.source_port)
+            for c in sink_port.connections(enabled=True)
+        )
+        return list(chain(*source_ports_per_virtual_connection))  # concatenate lists of ports
+
+    def sources_from_virtual_source_port(self, source_port):
+        """
+        Recursively resolve source ports over the virtual connections.
+        Results are memoized, a port met again while it is resolved is a loop.
+        """
+        block = source_port.parent_block
+        if not isinstance(block, blocks.VirtualSource):
+            return [source_port]  # nothing to resolve, we're done
+
+        # currently the validation does not allow multiple virtual sinks and one virtual source
+        # but in the future it may...
+        return self._resolve(self._upstream, source_port, (
+            self.sources_from_virtual_sink_port(b.sinks[0])
+            for b in self.sinks.get(block.stream_id, ())
+        ))
+
+    def sinks_from_virtual_source_port(self, source_port):
+        """
+        Resolve the sink port that is connected to the given virtual source port.
+        Use the get sink from virtual sink to recursively resolve subsequent ports.
+        """
+        sink_ports_per_virtual_connection = (
+            # there can be multiple ports per virtual connection
+            self.sinks_from_virtual_sink_port(c.sink_port)
+            for c in source_port.connections(enabled=True)
+        )
+        return list(chain(*sink_ports_per_virtual_connection))  # concatenate lists of ports
+
+    def sinks_from_virtual_sink_port(self, sink_port):
+        """
+        Recursively resolve sink ports over the virtual connections.
+        Results are memoized, a port met again while it is resolved is a loop.
+        """
+        block = sink_port.parent_block
+        if not isinstance(block, blocks.VirtualSink):
+            return [sink_port]
+
+        return self._resolve(self._downstream, sink_port, (
+            self.sinks_from_virtual_source_port(b.sources[0])
+            for b in self.sources.get(block.stream_id, ())
+        ))
+
+    @staticmethod
+    def _resolve(memo, port, ports_per_virtual_connection):
+        try:
+            ports = memo[port]
+        except KeyError:
+            pass
+        else:
+            if ports is None:
+                raise LoopError('Loop found when resolving port type')
+            return ports
+
+        memo[port] = None  # resolving
+        try:
+            ports = list(chain(*ports_per_virtual_connection))
+        except Exception:
+            del memo[port]
+            raise
+        memo[port] = ports
+        return ports
@@ -205,27 +205,20 @@ class Port(Element):
 
         enabled: None for all, True for enabled only, False for disabled only
         """
-        for con in self.parent_flowgraph.connections:
-            #TODO clean this up - but how to get past this validation
-            # things don't compare simply with an x in y because
-            # bus ports are created differently.
-            port_in_con = False
-            if self.dtype == 'bus':
-                if self.is_sink:
-                    if (self.parent.name == con.sink_port.parent.name and
-                            self.name == con.sink_port.name):
-                        port_in_con = True
-                elif self.is_source:
-                    if (self.parent.name == con.source_port.parent.name and
-                            self.name == con.source_port.name):
-                        port_in_con = True
-
-                if port_in_con:
-                    yield con
-
-            else:
-                if self in con and (enabled is None or enabled == con.enabled):
+        connections = self.parent_flowgraph.connections
+        if self.dtype != 'bus':
+            for con in list(connections.of_port(self)):
+                if enabled is None or enabled == con.enabled:
                     yield con
+            return
+
+        #TODO clean this up - but how to get past this validation
+        # things don't compare simply with an x in y because
+        # bus ports are created differently.
+        for con in list(connections.of_block(self.parent_block)):
+            con_port = con.sink_port if self.is_sink else con.source_port
+            if self.parent.name == con_port.parent.name and self.name == con_port.name:
+                yield con
 
     def get_associated_ports(self):
         if not self.dtype == 'bus':
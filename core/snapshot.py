@@ -0,0 +1,88 @@
+# Copyright 2021 Free Software Foundation, Inc.
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+"""
+Block library snapshot
+
+Holds the state of a completely built block library (block classes, domains,
+connection templates and categories) so that a start with unchanged block
+paths can skip parsing, validating and building the block descriptions.
+
+The file holds two pickles: the key the snapshot was made for and the
+library state. The state is only unpickled if the key matches.
+"""
+
+import logging
+import os
+import pickle
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 2
+
+
+def make_key(version, paths, files):
+    """
+    Make the key of a block library snapshot
+
+    Args:
+        version: the GRC version
+        paths: the list of block paths
+        files: all description files found in the block paths
+
+    Returns:
+        a picklable key which changes when any description file changes
+    """
+    stamps = []
+    for file_path in files:
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        stamps.append((file_path, stat.st_mtime_ns, stat.st_size))
+    return SNAPSHOT_FORMAT_VERSION, str(version), tuple(paths), tuple(stamps)
+
+
+class LibrarySnapshot(object):
+
+    def __init__(self, filename, key):
+        self.snapshot_file = filename
+        self.key = key
+
+    def load(self):
+        """Get the library state stored for this key (or None)"""
+        if self.key is None:
+            return None
+        try:
+            with open(self.snapshot_file, 'rb') as fp:
+                if pickle.load(fp) != self.key:
+                    logger.debug('Block library snapshot outdated')
+                    return None
+                state = pickle.load(fp)
+        except FileNotFoundError:
+            return None
+        except Exception as error:
+            logger.info(f"Unreadable block library snapshot {self.snapshot_file}: {error}")
+            return None
+        logger.debug(f"Loaded block library snapshot from: {self.snapshot_file}")
+        return state
+
+    def save(self, state):
+        """Store the library state for this key"""
+        if self.key is None:
+            return
+        temp_file = '{}.{}.tmp'.format(self.snapshot_file, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_file), exist_ok=True)
+            with open(temp_file, 'wb') as fp:
+                pickle.dump(self.key, fp, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(state, fp, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, self.snapshot_file)
+        except Exception as error:
+            logger.warning(f"Failed to save block library snapshot {self.snapshot_file}: {error}")
+            try:
+                os.remove(temp_file)
+            except OSError:
+                pass
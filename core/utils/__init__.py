@@ -5,7 +5,7 @@
 #
 
 
-from . import epy_block_io, expr_utils, extract_docs, flow_graph_complexity
+from . import epy_block_io, expr_utils, extract_docs, file_lock, flow_graph_complexity, import_cache, template_cache
 from .hide_bokeh_gui_options_if_not_installed import hide_bokeh_gui_options_if_not_installed
 
 
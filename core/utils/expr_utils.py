@@ -7,6 +7,7 @@ SPDX-License-Identifier: GPL-2.0-or-later
 """
 
 
+import functools
 import string
 
 
@@ -39,8 +40,7 @@ def get_variable_dependencies(expr, vars):
     Returns:
         a subset of vars used in the expression
     """
-    expr_toks = _expr_split(expr)
-    return set(v for v in vars if v in expr_toks)
+    return _identifiers(expr).intersection(vars)
 
 
 def sort_objects(objects, get_id, get_expr):
@@ -67,12 +67,48 @@ def sort_objects(objects, get_id, get_expr):
 import ast
 
 
+# max number of compiled expressions kept by compile_expr()
+EXPR_CACHE_SIZE = 8192
+
+
 def dependencies(expr, names=None):
-    node = ast.parse(expr, mode='eval')
-    used_ids = frozenset([n.id for n in ast.walk(node) if isinstance(n, ast.Name)])
+    used_ids = compile_expr(expr)[1]
     return used_ids & names if names else used_ids
 
 
+@functools.lru_cache(maxsize=EXPR_CACHE_SIZE)
+def compile_expr(expr):
+    """
+    Compile an expression for eval() and get the names it uses.
+    Results are cached, see compile_expr.cache_info() for the hit/miss counters.
+
+    Args:
+        expr: an expression string
+
+    Returns:
+        a tuple of the code object and the frozenset of used names
+    """
+    node = ast.parse(expr.lstrip(' \t'), mode='eval')  # eval() ignores leading blanks too
+    used_ids = frozenset([n.id for n in ast.walk(node) if isinstance(n, ast.Name)])
+    return compile(node, '<string>', 'eval'), used_ids
+
+
+def evaluate(expr, namespace, local_namespace=None):
+    """
+    Like eval(), but with the compiled expressions cached by compile_expr()
+
+    Args:
+        expr: an expression string (or code object)
+        namespace: the global namespace
+        local_namespace: the local namespace
+
+    Returns:
+        the value of the expression
+    """
+    code = compile_expr(expr)[0] if isinstance(expr, str) else expr
+    return eval(code, namespace, local_namespace)
+
+
 def sort_objects2(objects, id_getter, expr_getter, check_circular=True):
     known_ids = {id_getter(obj) for obj in objects}
 
@@ -98,43 +134,6 @@ def sort_objects2(objects, id_getter, expr_getter, check_circular=True):
 VAR_CHARS = string.ascii_letters + string.digits + '_'
 
 
-class _graph(object):
-    """
-    Simple graph structure held in a dictionary.
-    """
-
-    def __init__(self):
-        self._graph = dict()
-
-    def __str__(self):
-        return str(self._graph)
-
-    def add_node(self, node_key):
-        if node_key in self._graph:
-            return
-        self._graph[node_key] = set()
-
-    def remove_node(self, node_key):
-        if node_key not in self._graph:
-            return
-        for edges in self._graph.values():
-            if node_key in edges:
-                edges.remove(node_key)
-        self._graph.pop(node_key)
-
-    def add_edge(self, src_node_key, dest_node_key):
-        self._graph[src_node_key].add(dest_node_key)
-
-    def remove_edge(self, src_node_key, dest_node_key):
-        self._graph[src_node_key].remove(dest_node_key)
-
-    def get_nodes(self):
-        return list(self._graph.keys())
-
-    def get_edges(self, node_key):
-        return self._graph[node_key]
-
-
 def _expr_split(expr, var_chars=VAR_CHARS):
     """
     Split up an expression by non alphanumeric characters, including underscore.
@@ -167,32 +166,51 @@ def _expr_split(expr, var_chars=VAR_CHARS):
     return [t for t in toks if t]
 
 
-def _get_graph(exprs):
+# nodes holding identifiers (besides ast.Name) of code like "self.x = foo(x=x)"
+_IDENTIFIER_FIELDS = {
+    ast.Attribute: 'attr',
+    ast.keyword: 'arg',
+    ast.arg: 'arg',
+    ast.FunctionDef: 'name',
+    ast.ClassDef: 'name',
+}
+
+
+@functools.lru_cache(maxsize=EXPR_CACHE_SIZE)
+def _identifiers(expr):
     """
-    Get a graph representing the variable dependencies
+    Get the identifiers in a piece of code (outside of string literals)
 
     Args:
-        exprs: a mapping of variable name to expression
+        expr: an expression string or python code
 
     Returns:
-        a graph of variable deps
+        a frozenset of identifiers
     """
-    vars = list(exprs.keys())
-    # Get dependencies for each expression, load into graph
-    var_graph = _graph()
-    for var in vars:
-        var_graph.add_node(var)
-    for var, expr in exprs.items():
-        for dep in get_variable_dependencies(expr, vars):
-            if dep != var:
-                var_graph.add_edge(dep, var)
-    return var_graph
+    try:
+        tree = ast.parse(expr)
+    except (SyntaxError, ValueError):
+        # not python code (e.g. a template with a gui hint), split it instead
+        return frozenset(tok for tok in _expr_split(expr) if tok[0] in VAR_CHARS)
+    identifiers = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            identifiers.add(node.id)
+        else:
+            field = _IDENTIFIER_FIELDS.get(type(node))
+            if field and getattr(node, field):
+                identifiers.add(getattr(node, field))
+    return frozenset(identifiers)
 
 
 def _sort_variables(exprs):
     """
     Get a list of variables in order of dependencies.
 
+    The variables nothing depends on are in the last layer, every other
+    variable is one layer before the last of its dependents. The layers are
+    output in reverse, each one in reverse alphabetical order.
+
     Args:
         exprs: a mapping of variable name to expression
 
@@ -200,17 +218,42 @@ def _sort_variables(exprs):
         a list of variable names
     @throws Exception circular dependencies
     """
-    var_graph = _get_graph(exprs)
-    sorted_vars = list()
-    # Determine dependency order
-    while var_graph.get_nodes():
-        # Get a list of nodes with no edges
-        indep_vars = [var for var in var_graph.get_nodes() if not var_graph.get_edges(var)]
-        if not indep_vars:
-            raise Exception('circular dependency caught in sort_variables')
-        # Add the indep vars to the end of the list
-        sorted_vars.extend(sorted(indep_vars))
-        # Remove each edge-less node from the graph
-        for var in indep_vars:
-            var_graph.remove_node(var)
-    return reversed(sorted_vars)
+    names = set(exprs)
+    dependencies = {var: (_identifiers(expr) & names) - {var} for var, expr in exprs.items()}
+    num_dependents = dict.fromkeys(exprs, 0)
+    for deps in dependencies.values():
+        for dep in deps:
+            num_dependents[dep] += 1
+
+    layer = dict.fromkeys(exprs, 0)
+    done = [var for var, count in num_dependents.items() if not count]
+    for var in done:  # extended while iterating (Kahn's algorithm)
+        for dep in dependencies[var]:
+            layer[dep] = max(layer[dep], layer[var] + 1)
+            num_dependents[dep] -= 1
+            if not num_dependents[dep]:
+                done.append(dep)
+
+    if len(done) < len(exprs):
+        cycle = _find_cycle(dependencies, names.difference(done))
+        raise Exception('circular dependency caught in sort_variables: {}'.format(
+            ' -> '.join(cycle)))
+    return sorted(exprs, key=lambda var: (layer[var], var), reverse=True)
+
+
+def _find_cycle(dependencies, remaining):
+    """Get a list of variables, each one depending on the next, the last one is the first"""
+    dependents = {var: [] for var in remaining}
+    for var in remaining:
+        for dep in dependencies[var]:
+            if dep in remaining:
+                dependents[dep].append(var)
+    # each remaining variable has a remaining dependent, follow them until one repeats
+    path, index = [], {}
+    var = min(remaining)
+    while var not in index:
+        index[var] = len(path)
+        path.append(var)
+        var = min(dependents[var])
+    cycle = path[index[var]:] + [var]
+    return cycle[::-1]
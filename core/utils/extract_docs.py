@@ -8,13 +8,22 @@ SPDX-License-Identifier: GPL-2.0-or-later
 
 
 import sys
+import os
 import re
 import subprocess
 import threading
 import json
 import random
 import itertools
+import functools
+import glob
 import queue
+import importlib.util
+
+try:
+    import importlib.metadata as importlib_metadata
+except ImportError:  # python < 3.8
+    importlib_metadata = None
 
 
 ###############################################################################
@@ -94,6 +103,171 @@ def docstring_from_make(key, imports, make):
     return doc_strings
 
 
+###############################################################################
+# Persistent cache of extracted docstrings
+###############################################################################
+
+def _imported_modules(key, imports):
+    """Get the names of the modules a docstring query depends on"""
+    if not imports:
+        # see docstring_guess_from_key()
+        package = key.partition('_')[0]
+        return sorted({'gnuradio', 'gnuradio.' + package, package})
+    names = set()
+    for line in imports.splitlines():
+        match = re.match(
+            r'\s*(?:from\s+([\w.]+)\s+import\s+\(?([\w., \t]+)|import\s+([\w., \t]+))', line)
+        if not match:
+            continue
+        if match.group(1):  # the imported names may be submodules
+            module = match.group(1)
+            names.add(module)
+            members = [module + '.' + member.strip()
+                       for member in match.group(2).split(',') if member.strip()]
+        else:
+            members = match.group(3).split(',')
+        for name in members:
+            name = name.split()[0] if name.strip() else ''
+            if name and not name.startswith('.'):
+                names.add(name)
+    return sorted(names)
+
+
+@functools.lru_cache(maxsize=None)
+def _packages_distributions():
+    try:
+        return importlib_metadata.packages_distributions()
+    except AttributeError:  # python < 3.10
+        return {}
+
+
+def _distribution_version(name):
+    """Get the version of the distribution(s) providing a top-level package"""
+    if importlib_metadata is None:
+        return None
+    versions = []
+    for distribution in _packages_distributions().get(name, [name]):
+        try:
+            versions.append(importlib_metadata.version(distribution))
+        except Exception:  # not installed as a distribution
+            pass
+    return sorted(versions) or None
+
+
+def module_stamp(name):
+    """
+    Get a stamp of an installed module without importing it (or its parents)
+
+    Args:
+        name: the (dotted) module name
+
+    Returns:
+        the version of the distribution of the top-level package and the
+        locations and mtimes of the module files and package directories
+        along the name (changes if any of them is reinstalled or updated)
+    """
+    top_level, _, submodule = name.partition('.')
+    try:
+        spec = importlib.util.find_spec(top_level)
+    except (ImportError, ValueError):
+        spec = None
+    if spec is None:
+        return name, None
+    locations = [spec.origin] if spec.has_location else []
+    directories = list(spec.submodule_search_locations or [])
+    locations += directories
+    for part in filter(None, submodule.split('.')):
+        found = []
+        for directory in directories:
+            found += glob.glob(os.path.join(glob.escape(directory), part + '.*'))
+            package = os.path.join(directory, part)
+            if os.path.isdir(package):
+                found.append(package)
+                found += glob.glob(os.path.join(glob.escape(package), '__init__.*'))
+        locations += found
+        directories = [path for path in found if os.path.isdir(path)]
+    stamps = []
+    for location in sorted(set(locations)):
+        try:
+            stamps.append((location, os.path.getmtime(location)))
+        except OSError:
+            stamps.append((location, None))
+    return name, _distribution_version(top_level), stamps
+
+
+class DocstringCache(object):
+    """
+    Docstrings extracted in earlier runs, stored as a JSON file
+
+    An entry is used if the import/make templates of the block and the stamps
+    of the modules imported by them are unchanged.
+    """
+
+    FORMAT_VERSION = 2
+
+    def __init__(self, filename):
+        self.cache_file = filename
+        self._entries = {}
+        self._module_stamps = {}
+        self._lock = threading.Lock()
+        self.need_cache_write = False
+        self._version = [self.FORMAT_VERSION, sys.version]
+
+    def load(self):
+        try:
+            with open(self.cache_file, encoding='utf-8') as cache_file:
+                data = json.load(cache_file)
+            if data.get('version') != self._version:
+                raise ValueError('Outdated docstring cache')
+            self._entries = data['entries']
+        except (IOError, ValueError, KeyError, AttributeError):
+            self._entries = {}
+
+    def save(self):
+        with self._lock:
+            if not self.need_cache_write:
+                return
+            data = {'version': self._version, 'entries': dict(self._entries)}
+            self.need_cache_write = False
+        temp_file = '{}.{}.tmp'.format(self.cache_file, os.getpid())
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as cache_file:
+                json.dump(data, cache_file)
+            os.replace(temp_file, self.cache_file)
+        except (IOError, OSError) as error:
+            print("Warning: failed to save docstring cache:", error, file=sys.stderr)
+
+    def _stamp(self, key, imports):
+        stamps = []
+        for name in _imported_modules(key, imports):
+            try:
+                stamp = self._module_stamps[name]
+            except KeyError:
+                stamp = self._module_stamps[name] = module_stamp(name)
+            stamps.append(stamp)
+        # compare as JSON (tuples are stored as lists)
+        return json.loads(json.dumps(stamps))
+
+    def make_entry(self, key, imports, make):
+        """Get the (query, stamp) a cached result for these arguments has to match"""
+        return [imports, make], self._stamp(key, imports)
+
+    def get(self, key, entry):
+        """Get the cached docstrings of a block (or None)"""
+        query, stamp = entry
+        cached = self._entries.get(key)
+        if cached and cached['query'] == query and cached['stamp'] == stamp:
+            return cached['docs']
+        return None
+
+    def store(self, key, entry, docs):
+        query, stamp = entry
+        with self._lock:
+            self._entries[key] = {'query': query, 'stamp': stamp, 'docs': docs}
+            self.need_cache_write = True
+
+
 ###############################################################################
 # Manage docstring extraction in separate process
 ###############################################################################
@@ -108,88 +282,136 @@ class SubprocessLoader(object):
     AUTH_CODE = random.random()  # sort out unwanted output of worker process
     RESTART = 5  # number of worker restarts before giving up
     DONE = object()  # sentinel value to signal end-of-queue
+    BATCH_SIZE = 50  # max number of queries sent to a worker at once
 
-    def __init__(self, callback_query_result, callback_finished=None):
+    def __init__(self, callback_query_result, callback_finished=None, cache_file=None,
+                 workers=1, batch_size=BATCH_SIZE):
         self.callback_query_result = callback_query_result
         self.callback_finished = callback_finished or (lambda: None)
+        self.num_workers = max(1, workers)
+        self.batch_size = max(1, batch_size)
 
         self._queue = queue.Queue()
-        self._thread = None
-        self._worker = None
+        self._threads = []
+        self._workers = set()
+        self._lock = threading.Lock()
         self._shutdown = threading.Event()
-        self._last_cmd = None
+
+        self._cache = DocstringCache(cache_file) if cache_file else None
+        self._cache_loaded = False
+        self._pending = {}  # key -> cache entry of queries sent to the worker
 
     def start(self):
-        """ Start the worker process handler thread """
-        if self._thread is not None:
-            return
-        self._shutdown.clear()
-        thread = self._thread = threading.Thread(target=self.run_worker)
-        thread.daemon = True
-        thread.start()
+        """ Start the worker process handler threads """
+        with self._lock:
+            if self._threads:
+                return
+            self._shutdown.clear()
+            self._threads = [threading.Thread(target=self.run_worker)
+                             for _ in range(self.num_workers)]
+            threads = list(self._threads)
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
 
     def run_worker(self):
         """ Read docstring back from worker stdout and execute callback. """
+        batch = []  # commands sent to the worker which are not answered yet
         for _ in range(self.RESTART):
             if self._shutdown.is_set():
                 break
+            worker = None
             try:
-                self._worker = subprocess.Popen(
+                worker = subprocess.Popen(
                     args=(sys.executable, '-uc', self.BOOTSTRAP.format(__file__)),
                     stdin=subprocess.PIPE, stdout=subprocess.PIPE,
                     stderr=subprocess.PIPE
                 )
-                self._handle_worker()
+                self._workers.add(worker)
+                self._handle_worker(worker, batch)
 
             except (OSError, IOError):
                 msg = "Warning: restarting the docstring loader"
-                cmd, args = self._last_cmd
-                if cmd == 'query':
-                    msg += " (crashed while loading {0!r})".format(args[0])
+                if batch:
+                    # drop the command the worker crashed on, resend the others
+                    cmd, args = batch.pop(0)
+                    if cmd == 'query':
+                        msg += " (crashed while loading {0!r})".format(args[0])
                 print(msg, file=sys.stderr)
                 continue  # restart
             else:
                 break  # normal termination, return
             finally:
-                if self._worker:
-                    self._worker.stdin.close()
-                    self._worker.stdout.close()
-                    self._worker.stderr.close()
-                    self._worker.terminate()
-                    self._worker.wait()
+                if worker:
+                    self._workers.discard(worker)
+                    worker.stdin.close()
+                    worker.stdout.close()
+                    worker.stderr.close()
+                    worker.terminate()
+                    worker.wait()
         else:
             print("Warning: docstring loader crashed too often", file=sys.stderr)
-        self._thread = None
-        self._worker = None
-        self.callback_finished()
-
-    def _handle_worker(self):
-        """ Send commands and responses back from worker. """
-        assert '1' == self._worker.stdout.read(1).decode('utf-8')
-        for cmd, args in iter(self._queue.get, self.DONE):
-            self._last_cmd = cmd, args
-            self._send(cmd, args)
-            cmd, args = self._receive()
-            self._handle_response(cmd, args)
-
-    def _send(self, cmd, args):
+
+        with self._lock:
+            self._threads.remove(threading.current_thread())
+            last_thread = not self._threads
+        if last_thread:
+            if self._cache:
+                self._cache.save()
+            self.callback_finished()
+
+    def _handle_worker(self, worker, batch):
+        """ Send batches of commands and responses back from worker. """
+        assert '1' == worker.stdout.read(1).decode('utf-8')
+        done = False
+        try:
+            while True:
+                if not batch:
+                    if done:
+                        break
+                    done = self._get_batch(batch)
+                if batch:
+                    self._send(worker, 'query_batch', batch)
+                    while batch:
+                        cmd, args = self._receive(worker)
+                        batch.pop(0)
+                        self._handle_response(cmd, args)
+        except (OSError, IOError):
+            if done:
+                self._queue.put(self.DONE)  # for the restarted worker
+            raise
+
+    def _get_batch(self, batch):
+        """ Get queued commands into batch, returns True at the end-of-queue """
+        cmd = self._queue.get()
+        while cmd is not self.DONE:
+            batch.append(cmd)
+            if len(batch) >= self.batch_size:
+                return False
+            try:
+                cmd = self._queue.get_nowait()
+            except queue.Empty:
+                return False
+        return True
+
+    def _send(self, worker, cmd, args):
         """ Send a command to worker's stdin """
-        fd = self._worker.stdin
+        fd = worker.stdin
         query = json.dumps((self.AUTH_CODE, cmd, args))
         fd.write(query.encode('utf-8'))
         fd.write(b'\n')
         fd.flush()
 
-    def _receive(self):
+    def _receive(self, worker):
         """ Receive response from worker's stdout """
-        for line in iter(self._worker.stdout.readline, ''):
+        for line in iter(worker.stdout.readline, ''):
             try:
                 key, cmd, args = json.loads(line.decode('utf-8'))
                 if key != self.AUTH_CODE:
                     raise ValueError('Got wrong auth code')
                 return cmd, args
             except ValueError:
-                if self._worker.poll():
+                if worker.poll():
                     raise IOError("Worker died")
                 else:
                     continue  # ignore invalid output from worker
@@ -200,6 +422,9 @@ class SubprocessLoader(object):
         """ Handle response from worker, call the callback """
         if cmd == 'result':
             key, docs = args
+            entry = self._pending.pop(key, None)
+            if entry and self._cache:
+                self._cache.store(key, entry, docs)
             self.callback_query_result(key, docs)
         elif cmd == 'error':
             print(args)
@@ -208,7 +433,20 @@ class SubprocessLoader(object):
 
     def query(self, key, imports=None, make=None):
         """ Request docstring extraction for a certain key """
-        if self._thread is None:
+        if not (imports and make):
+            imports = make = None
+        if self._cache:
+            if not self._cache_loaded:
+                self._cache.load()
+                self._cache_loaded = True
+            entry = self._cache.make_entry(key, imports, make)
+            docs = self._cache.get(key, entry)
+            if docs is not None:
+                self.callback_query_result(key, docs)
+                return
+            self._pending[key] = entry
+
+        if not self._threads:
             self.start()
         if imports and make:
             self._queue.put(('query', (key, imports, make)))
@@ -217,21 +455,31 @@ class SubprocessLoader(object):
 
     def finish(self):
         """ Signal end of requests """
-        self._queue.put(self.DONE)
+        with self._lock:
+            num_threads = len(self._threads)
+        if not num_threads:
+            # all queries were answered from the cache, no worker was started
+            self.callback_finished()
+            return
+        for _ in range(num_threads):
+            self._queue.put(self.DONE)
 
     def wait(self):
-        """ Wait for the handler thread to die """
-        if self._thread:
-            self._thread.join()
+        """ Wait for the handler threads to die """
+        with self._lock:
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join()
 
     def terminate(self):
-        """ Terminate the worker and wait """
+        """ Terminate the workers and wait """
         self._shutdown.set()
-        try:
-            self._worker.terminate()
-            self.wait()
-        except (OSError, AttributeError):
-            pass
+        for worker in list(self._workers):
+            try:
+                worker.terminate()
+            except OSError:
+                pass
+        self.wait()
 
 
 ###############################################################################
@@ -242,7 +490,8 @@ def worker_main():
     """
     Main entry point for the docstring extraction process.
     Manages RPC with main process through stdin/stdout.
-    Runs a docstring extraction for each key it read on stdin.
+    Runs a docstring extraction for each key it read on stdin,
+    a batch of queries is answered with one response per query.
     """
     def send(code, cmd, args):
         json.dump((code, cmd, args), sys.stdout)
@@ -253,8 +502,7 @@ def worker_main():
     sys.stdout.write('1')
     # flush out to signal the main process we are ready for new commands
     sys.stdout.flush()
-    for line in iter(sys.stdin.readline, ''):
-        code, cmd, args = json.loads(line)
+    def handle(code, cmd, args):
         try:
             if cmd == 'query':
                 key, imports, make = args
@@ -262,11 +510,21 @@ def worker_main():
             elif cmd == 'query_key_only':
                 key, = args
                 send(code, 'result', (key, docstring_guess_from_key(key)))
-            elif cmd == 'exit':
-                break
+            else:
+                send(code, 'error', 'Unknown command {!r}'.format(cmd))
         except Exception as e:
             send(code, 'error', repr(e))
 
+    for line in iter(sys.stdin.readline, ''):
+        code, cmd, args = json.loads(line)
+        if cmd == 'query_batch':
+            for query_cmd, query_args in args:
+                handle(code, query_cmd, query_args)
+        elif cmd == 'exit':
+            break
+        else:
+            handle(code, cmd, args)
+
 
 if __name__ == '__worker__':
     worker_main()
@@ -0,0 +1,48 @@
+# Copyright 2021 Free Software Foundation, Inc.
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+"""
+Advisory locks for the cache files shared by concurrent GRC processes
+"""
+
+import contextlib
+import logging
+import os
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+@contextlib.contextmanager
+def locked(filename):
+    """
+    Hold an exclusive lock for a file while in the context
+
+    The lock is taken on a separate lock file next to the file, so the file
+    itself may be replaced. Without fcntl no lock is taken.
+
+    Args:
+        filename: the path of the file to lock
+    """
+    if fcntl is None:
+        yield
+        return
+    lock_file = filename + '.lock'
+    try:
+        os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+        fp = open(lock_file, 'a')
+    except (IOError, OSError) as error:
+        logger.debug(f"Cannot lock {filename}: {error}")
+        yield
+        return
+    try:
+        fcntl.flock(fp, fcntl.LOCK_EX)
+        yield
+    finally:
+        fp.close()  # releases the lock
@@ -0,0 +1,56 @@
+# Copyright 2021 Free Software Foundation, Inc.
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+"""
+Process-wide cache of executed import statements
+
+The import templates of blocks are run for every block on every rewrite, while
+most of them are the same few lines. Each distinct snippet is run once, its
+namespace (or error) is kept and copied into the namespaces it is used in.
+"""
+
+_cache = {}  # import statements -> (names, error)
+
+
+def exec_imports(imports, namespace):
+    """
+    Run import statements in a namespace (once per process)
+
+    Args:
+        imports: a string of import statements
+        namespace: the dict to add the imported names to
+
+    Raises:
+        the error of running the imports, the names imported before it are added
+    """
+    try:
+        names, error = _cache[imports]
+    except KeyError:
+        names, error = {}, None
+        try:
+            exec(imports, names)
+        except Exception as e:
+            error = e
+        names.pop('__builtins__', None)
+        _cache[imports] = names, error
+
+    namespace.update(names)
+    if error is not None:
+        raise error.with_traceback(None)
+
+
+def clear(failures_only=False):
+    """
+    Forget executed imports, e.g. after new modules (hier blocks) were generated
+
+    Args:
+        failures_only: only forget the imports that failed
+    """
+    if not failures_only:
+        _cache.clear()
+        return
+    for imports, (_, error) in list(_cache.items()):
+        if error is not None:
+            del _cache[imports]
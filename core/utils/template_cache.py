@@ -0,0 +1,105 @@
+# Copyright 2021 Free Software Foundation, Inc.
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-2.0-or-later
+#
+"""
+Persistent cache of compiled mako templates
+
+Compiling a template to a python module takes much longer than loading the
+module. The modules are kept in a directory (per mako version) using the
+module_directory support of mako, so that new processes (e.g. the workers of
+a batch compile) load them instead of compiling the templates again.
+Templates given as text are stored as a source file (named by its hash) in
+the same directory first.
+"""
+
+import hashlib
+import logging
+import os
+
+import mako
+from mako.template import Template
+
+from .. import Constants
+
+logger = logging.getLogger(__name__)
+
+
+def module_directory():
+    return os.path.join(Constants.TEMPLATE_MODULE_DIR, 'mako-' + mako.__version__)
+
+
+def from_file(filename, **kwargs):
+    """
+    Get the template of a file, compiled only if the file changed
+
+    Args:
+        filename: the path of the template
+        kwargs: passed on to the template
+
+    Returns:
+        a mako template
+    """
+    try:
+        return Template(filename=filename, module_directory=module_directory(), **kwargs)
+    except OSError as error:
+        logger.warning('Failed to cache the compiled template %s: %s', filename, error)
+        return Template(filename=filename, **kwargs)
+
+
+def from_text(text, **kwargs):
+    """
+    Get a template, compiled only the first time it is seen (by any process)
+
+    Args:
+        text: the template source
+        kwargs: passed on to the template
+
+    Returns:
+        a mako template
+    """
+    uri = _get_uri(text, kwargs)
+    source_file = os.path.join(module_directory(), uri)
+    try:
+        if not os.path.exists(source_file):
+            _write(source_file, text)
+        return Template(filename=source_file, uri=uri, module_directory=module_directory(),
+                        input_encoding='utf-8', **kwargs)
+    except OSError as error:
+        logger.warning('Failed to cache the compiled template %r: %s', text, error)
+        return Template(text, **kwargs)
+
+
+def precompile(texts, **kwargs):
+    """
+    Compile the templates not in the cache yet (e.g. those of a new block library)
+
+    Args:
+        texts: template sources, invalid ones are reported when they are used
+        kwargs: passed on to the templates
+    """
+    for text in texts:
+        if os.path.exists(os.path.join(module_directory(), _get_uri(text, kwargs))):
+            continue
+        try:
+            from_text(text, **kwargs)
+        except Exception as error:
+            logger.debug('Failed to precompile the template %r: %s', text, error)
+
+
+def _get_uri(text, options):
+    digest = hashlib.sha1(repr((text, sorted(options.items()))).encode('utf-8'))
+    return 'text/{}.mako'.format(digest.hexdigest())
+
+
+def _write(filename, text):
+    temp_file = '{}.{}.tmp'.format(filename, os.getpid())
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as fp:
+            fp.write(text)
+        os.replace(temp_file, filename)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
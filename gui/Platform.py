@@ -55,6 +55,10 @@ class Platform(CorePlatform):
         cls = CorePlatform.new_block_class(self, **data)
         return canvas.Block.make_cls_with_base(cls)
 
+    def restore_block_class(self, state):
+        cls = CorePlatform.restore_block_class(self, state)
+        return canvas.Block.make_cls_with_base(cls)
+
     block_classes_build_in = {key: canvas.Block.make_cls_with_base(cls)
                               for key, cls in CorePlatform.block_classes_build_in.items()}
     block_classes = ChainMap({}, block_classes_build_in)
@@ -95,7 +95,7 @@ class FlowGraph(CoreFlowgraph, Drawable):
         Returns:
             a unique id
         """
-        block_ids = set(b.name for b in self.blocks)
+        block_ids = self.get_block_names()
         for index in count():
             block_id = '{}_{}'.format(base_id, index)
             if block_id not in block_ids:
@@ -267,7 +267,7 @@ class FlowGraph(CoreFlowgraph, Drawable):
 
             block_name = block_n.get('name')
             # Verify whether a block with this name exists before adding it
-            if block_name in (blk.name for blk in self.blocks):
+            if block_name in self.get_block_names():
                 block_n = block_n.copy()
                 block_n['name'] = self._get_unique_id(block_name)
 
@@ -0,0 +1,24 @@
+# Copyright 2021 Free Software Foundation, Inc.
+#
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import pytest
+
+from grc.core import Constants
+
+
+@pytest.fixture
+def cache_file(tmp_path, monkeypatch):
+    cache_file = str(tmp_path / 'cache' / 'cache.bin')
+    monkeypatch.setattr(Constants, 'CACHE_FILE', cache_file)
+    monkeypatch.setattr(Constants, 'LIBRARY_SNAPSHOT_FILE',
+                        str(tmp_path / 'cache' / 'library.pickle'))
+    monkeypatch.setattr(Constants, 'DOCSTRING_CACHE_FILE',
+                        str(tmp_path / 'cache' / 'docstrings.json'))
+    monkeypatch.setattr(Constants, 'BUILD_MANIFEST_FILE',
+                        str(tmp_path / 'cache' / 'build_manifest.json'))
+    monkeypatch.setattr(Constants, 'TEMPLATE_MODULE_DIR', str(tmp_path / 'cache' / 'mako'))
+    return cache_file
@@ -43,3 +43,23 @@ def test_parse_error():
 def test_parse_error2():
     with pytest.raises(TemplateError):
         MakoTemplates(_bind_to=Block(num='123'), test='abc${ WRONG_VAR }').render('test')
+
+
+def test_rendered_cache():
+    block = Block(num='123')
+    block.params_revision = 0
+    block.templates['test'] = ['abc${num}']
+    stats = MakoTemplates.render_stats
+    hits, misses = stats['hits'], stats['misses']
+
+    assert block.templates.render('test') == ['abc123']
+    block.templates.render('test').append('modified')
+    assert block.templates.render('test') == ['abc123']
+    assert (stats['hits'] - hits, stats['misses'] - misses) == (2, 1)
+
+    block.namespace_templates['num'] = '456'
+    assert block.templates.render('test') == ['abc123']  # outdated, until a param changed
+    block.params_revision += 1
+    assert block.templates.render('test') == ['abc456']
+    block.templates['test'] = 'def${num}'
+    assert block.templates.render('test') == 'def456'
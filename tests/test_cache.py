@@ -0,0 +1,94 @@
+# Copyright 2021 Free Software Foundation, Inc.
+#
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+import time
+
+from grc.core.cache import Cache
+
+
+def write_yaml(path, text):
+    path.write_text(text)
+    past = time.time() - 10
+    os.utime(str(path), (past, past))
+    return str(path)
+
+
+def test_roundtrip(tmp_path):
+    cache_file = str(tmp_path / 'cache.bin')
+    file1 = write_yaml(tmp_path / 'a.block.yml', 'id: a\nlabel: A\n')
+    file2 = write_yaml(tmp_path / 'b.block.yml', 'id: b\n')
+
+    with Cache(cache_file, version='1.0') as cache:
+        assert cache.get_or_load(file1) == {'id': 'a', 'label': 'A'}
+        assert cache.get_or_load(file2) == {'id': 'b'}
+
+    with Cache(cache_file, version='1.0') as cache:
+        assert cache.is_cached(file1)
+        assert cache.get_or_load(file1) == {'id': 'a', 'label': 'A'}
+        assert not cache.need_cache_write
+    assert cache._map is None  # released without saving
+
+
+def test_update_appends(tmp_path):
+    cache_file = str(tmp_path / 'cache.bin')
+    files = [write_yaml(tmp_path / '{}.block.yml'.format(i), 'id: b{}\n'.format(i))
+             for i in range(10)]
+    with Cache(cache_file, version='1.0') as cache:
+        for file_path in files:
+            cache.get_or_load(file_path)
+
+    with open(cache_file, 'rb') as fp:
+        before = fp.read()
+
+    with Cache(cache_file, version='1.0') as cache:
+        cache.store(files[0], {'id': 'changed'})
+
+    with open(cache_file, 'rb') as fp:
+        after = fp.read()
+    assert after.startswith(before)
+
+    with Cache(cache_file, version='1.0') as cache:
+        assert cache.get_or_load(files[0]) == {'id': 'changed'}
+        assert cache.get_or_load(files[1]) == {'id': 'b1'}
+
+
+def test_version_change(tmp_path):
+    cache_file = str(tmp_path / 'cache.bin')
+    file1 = write_yaml(tmp_path / 'a.block.yml', 'id: a\n')
+    with Cache(cache_file, version='1.0') as cache:
+        cache.get_or_load(file1)
+
+    with Cache(cache_file, version='2.0') as cache:
+        assert not cache.is_cached(file1)
+        assert cache.need_cache_write
+
+
+def test_concurrent_rewrite(tmp_path):
+    cache_file = str(tmp_path / 'cache.bin')
+    file1 = write_yaml(tmp_path / 'a.block.yml', 'id: a\n')
+    file2 = write_yaml(tmp_path / 'b.block.yml', 'id: b\n')
+    file3 = write_yaml(tmp_path / 'c.block.yml', 'id: c\n')
+    with Cache(cache_file, version='1.0') as cache:
+        cache.get_or_load(file1)
+        cache.get_or_load(file2)
+
+    compacting = Cache(cache_file, version='1.0')
+    compacting.load()
+    with Cache(cache_file, version='1.0') as cache:  # another process
+        cache.store(file1, {'id': 'changed'})
+        cache.get_or_load(file3)
+
+    compacting.get_or_load(file1)
+    compacting.prune()  # drops file2, forces a rewrite
+    compacting.save()
+
+    with Cache(cache_file, version='1.0') as cache:
+        assert cache.get_or_load(file1) == {'id': 'changed'}
+        assert cache.get_or_load(file3) == {'id': 'c'}
+        assert not cache.is_cached(file2)
+    assert not [name for name in os.listdir(str(tmp_path)) if name.endswith('.tmp')]
@@ -25,3 +25,25 @@ def test_compiler(capsys):
 
     out, err = capsys.readouterr()
     assert not err
+
+
+def test_compiler_jobs(tmp_path, cache_file):
+    with open(path.join(path.dirname(__file__), 'resources', 'test_compiler.grc')) as fp:
+        source = fp.read()
+    assert '<value>top_block</value>' in source
+    grc_files = []
+    for index in range(4):  # distinct flow graphs, so several workers are busy
+        grc_file = tmp_path / 'flow_graph_{}.grc'.format(index)
+        grc_file.write_text(source.replace(
+            '<value>top_block</value>', '<value>flow_graph_{}</value>'.format(index)))
+        grc_files.append(str(grc_file))
+
+    outputs = []
+    for jobs in (1, 2):
+        output_dir = tmp_path / 'out_{}'.format(jobs)
+        main(Namespace(output=str(output_dir), user_lib_dir=False,
+                       grc_files=grc_files, run=False, jobs=jobs))
+        outputs.append({p.name: p.read_text() for p in output_dir.iterdir()})
+
+    assert sorted(outputs[0]) == ['flow_graph_{}.py'.format(index) for index in range(4)]
+    assert outputs[0] == outputs[1]
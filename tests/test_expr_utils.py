@@ -38,3 +38,69 @@ def test_circular():
     # Should fail due to circular dependency
     with pytest.raises(Exception):
         expr_utils.sort_objects(test, id_getter, expr_getter)
+
+
+def test_compile_expr():
+    code, names = expr_utils.compile_expr(' a + len(b) * 2')
+    assert names == {'a', 'len', 'b'}
+    assert eval(code, {'a': 1, 'b': 'xy'}) == 5
+
+    with pytest.raises(SyntaxError):
+        expr_utils.compile_expr('a +')
+
+
+def test_evaluate_cached():
+    expr_utils.compile_expr.cache_clear()
+    assert expr_utils.evaluate('a * 2', {'a': 2}) == 4
+    assert expr_utils.evaluate('a * 2', {'a': 3}) == 6
+    assert expr_utils.evaluate('a * b', {'a': 3}, {'b': 3}) == 9
+    info = expr_utils.compile_expr.cache_info()
+    assert (info.hits, info.misses) == (1, 2)
+
+
+def _peel_sort(exprs):
+    """The former sort: repeatedly take the variables nothing depends on"""
+    deps = {var: {v for v in exprs if v != var and v in expr_utils._expr_split(expr)}
+            for var, expr in exprs.items()}
+    remaining, peeled = set(exprs), []
+    while remaining:
+        layer = sorted(var for var in remaining
+                       if not any(var in deps[other] for other in remaining))
+        peeled.extend(layer)
+        remaining.difference_update(layer)
+    return peeled[::-1]
+
+
+def test_sort_order():
+    import random
+    rand = random.Random(0)
+    for _ in range(50):
+        names = ['v{}'.format(i) for i in range(rand.randint(1, 15))]
+        rand.shuffle(names)
+        exprs = {name: ' + '.join(rand.sample(names[:i], rand.randint(0, i)) or ['1'])
+                 for i, name in enumerate(names)}
+        objects = sorted(exprs.items(), key=lambda obj: rand.random())
+        out = expr_utils.sort_objects(objects, id_getter, expr_getter)
+        assert [obj[0] for obj in out] == _peel_sort(exprs)
+
+
+def test_sort_statements():
+    objects = [
+        ['probe', 'self.probe = probe = self.src.level()'],
+        ['src', "self.src = src = source(rate, 'rate')"],
+        ['rate', 'self.rate = rate = 1e3'],
+        ['tab', 'tab@0: 1,0,1,1 widget(rate)'],  # not python
+    ]
+    out = expr_utils.sort_objects(objects, id_getter, expr_getter)
+    assert [obj[0] for obj in out] == ['rate', 'src', 'tab', 'probe']
+
+
+def test_circular_report():
+    test = [
+        ['a', 'b + 1'],
+        ['b', 'c + x'],
+        ['c', 'a * 2'],
+        ['d', 'a'],
+    ]
+    with pytest.raises(Exception, match=r'sort_variables: a -> b -> c -> a'):
+        expr_utils.sort_objects(test, id_getter, expr_getter)
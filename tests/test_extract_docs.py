@@ -0,0 +1,78 @@
+# Copyright 2021 Free Software Foundation, Inc.
+#
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import json
+import os
+import sys
+
+from grc.core.utils.extract_docs import SubprocessLoader, _imported_modules, module_stamp
+
+
+def run_queries(cache_file, *queries, **kwargs):
+    results = {}
+    finished = []
+    loader = SubprocessLoader(
+        callback_query_result=results.__setitem__,
+        callback_finished=lambda: finished.append(True),
+        cache_file=cache_file,
+        **kwargs
+    )
+    for query in queries:
+        loader.query(*query)
+    started = bool(loader._threads)
+    loader.finish()
+    loader.wait()
+    assert finished == [True]
+    return results, started
+
+
+def test_docstring_cache(tmp_path):
+    cache_file = str(tmp_path / 'docstrings.json')
+    query = ('json_dumps', 'import json', 'json.dumps(${obj})')
+
+    results, started = run_queries(cache_file, query)
+    assert started
+    assert results['json_dumps'] == {'json_dumps': json.dumps.__doc__}
+
+    # cached
+    assert run_queries(cache_file, query) == (results, False)
+
+    # changed make template
+    _, started = run_queries(cache_file, query[:2] + ('json.loads(${obj})',))
+    assert started
+
+
+def test_worker_pool(tmp_path):
+    names = ['dumps', 'loads', 'dump', 'load', 'JSONDecoder', 'JSONEncoder']
+    queries = [('json_' + name, 'import json', 'json.{}()'.format(name)) for name in names]
+
+    results, _ = run_queries(None, *queries, workers=3, batch_size=2)
+    assert results == {
+        'json_' + name: {'json_' + name: getattr(json, name).__doc__} for name in names
+    }
+
+
+def test_module_stamp(tmp_path, monkeypatch):
+    assert _imported_modules('x', 'from pkg import sub, other\nimport os.path') == [
+        'os.path', 'pkg', 'pkg.other', 'pkg.sub']
+
+    package = tmp_path / 'pkg'
+    (package / 'sub').mkdir(parents=True)
+    (package / '__init__.py').write_text('raise ImportError')
+    (package / 'sub' / '__init__.py').write_text('')
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    stamp = module_stamp('pkg.sub')
+    assert 'pkg' not in sys.modules
+    assert str(package / 'sub' / '__init__.py') in [location for location, _ in stamp[2]]
+    assert module_stamp('pkg.sub') == stamp
+
+    # a new module file in the (unchanged) top-level package
+    (package / 'sub' / 'blocks.py').write_text('')
+    os.utime(str(package / 'sub'), (0, 0))
+    assert module_stamp('pkg.sub') != stamp
+    assert module_stamp('missing.sub') == ('missing.sub', None)
@@ -0,0 +1,337 @@
+# Copyright 2021 Free Software Foundation, Inc.
+#
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+from os import path
+
+import pytest
+
+from grc.core.platform import Platform
+
+BLOCK_PATHS = [path.join(path.dirname(__file__), '../../grc/blocks')]
+
+
+@pytest.fixture(scope='module')
+def platform():
+    platform = Platform(
+        name='GNU Radio Companion Compiler',
+        prefs=None,
+        version='0.0.0',
+    )
+    platform.build_library(BLOCK_PATHS)
+    return platform
+
+
+def add_variable(flow_graph, name, value):
+    block = flow_graph.new_block('variable')
+    block.params['id'].set_value(name)
+    block.params['value'].set_value(value)
+    return block
+
+
+def test_evaluate_cache(platform):
+    flow_graph = platform.make_flow_graph()
+    var_a = add_variable(flow_graph, 'a', '1')
+    add_variable(flow_graph, 'b', 'a * 2')
+    add_variable(flow_graph, 'c', '10')
+    flow_graph.rewrite()
+
+    assert flow_graph.evaluate('b + 1') == 3
+    entry = flow_graph._eval_cache['b + 1']
+    assert flow_graph.evaluate('b + 1') == 3
+    assert flow_graph._eval_cache['b + 1'] is entry  # cache hit
+
+    with pytest.raises(NameError):
+        flow_graph.evaluate('d')
+
+    # changing an unrelated variable keeps the entry
+    var_c = flow_graph.get_block('c')
+    var_c.params['value'].set_value('20')
+    flow_graph.rewrite()
+    assert flow_graph.evaluate('b + 1') == 3
+    assert flow_graph._eval_cache['b + 1'] is entry
+
+    # changing a (indirect) dependency invalidates it
+    var_a.params['value'].set_value('5')
+    flow_graph.rewrite()
+    assert flow_graph.evaluate('b + 1') == 11
+
+    add_variable(flow_graph, 'd', 'c')
+    flow_graph.rewrite()
+    assert flow_graph.evaluate('d') == 20
+
+
+def test_evaluate_cache_mutable(platform):
+    flow_graph = platform.make_flow_graph()
+    add_variable(flow_graph, 'items', '[1, 2]')
+    flow_graph.rewrite()
+
+    assert flow_graph.evaluate('len(items)') == 2
+    flow_graph.namespace['items'].append(3)  # changed in place
+    assert flow_graph.evaluate('len(items)') == 3
+    assert flow_graph.evaluate('[1] * 2') is not flow_graph.evaluate('[1] * 2')
+    assert flow_graph.evaluate('(1, "a")') == (1, 'a')
+    assert '(1, "a")' in flow_graph._eval_cache
+
+    errors = []
+    for _ in range(2):
+        with pytest.raises(NameError) as error:
+            flow_graph.evaluate('missing')
+        errors.append(error.value)
+    assert errors[0] is not errors[1]
+
+
+def test_incremental_rewrite(platform, monkeypatch):
+    flow_graph = platform.make_flow_graph()
+    var_a = add_variable(flow_graph, 'a', '1')
+    add_variable(flow_graph, 'b', 'a * 2')
+    add_variable(flow_graph, 'c', '10')
+    note = flow_graph.new_block('note')
+    note.params['id'].set_value('note_0')
+    note.params['note'].set_value('str(b)')
+    flow_graph.rewrite()
+
+    rewritten = []
+    for block in flow_graph.blocks:
+        monkeypatch.setattr(block, 'rewrite', lambda block=block: (
+            rewritten.append(block.name), type(block).rewrite(block)))
+
+    var_a.params['value'].set_value('5')
+    flow_graph.rewrite()
+    assert sorted(rewritten) == ['a', 'b', 'note_0']
+    assert flow_graph.namespace['b'] == 10
+    assert note.params['note'].get_evaluated() == '10'
+
+    del rewritten[:]
+    flow_graph.rewrite()
+    assert rewritten == []
+
+    # a new dependency may change the order of variables
+    var_a.params['value'].set_value('c + 1')
+    flow_graph.rewrite()
+    assert set(rewritten) == {block.name for block in flow_graph.blocks}
+    assert flow_graph.namespace['b'] == 22
+
+
+def test_incremental_rewrite_gui_hints(platform, monkeypatch):
+    monkeypatch.setitem(platform.blocks, 'qtgui_tab_widget', platform.new_block_class(
+        id='qtgui_tab_widget', parameters=[{'id': 'num_tabs', 'dtype': 'int', 'default': '2'}]))
+    monkeypatch.setitem(platform.blocks, 'test_widget', platform.new_block_class(
+        id='test_widget', parameters=[{'id': 'gui_hint', 'dtype': 'gui_hint', 'default': ''}]))
+
+    flow_graph = platform.make_flow_graph()
+    tabs = flow_graph.new_block('qtgui_tab_widget')
+    tabs.params['id'].set_value('tabs')
+    add_variable(flow_graph, 'row', '0')
+    widget = flow_graph.new_block('test_widget')
+    widget.params['id'].set_value('widget')
+    hint = widget.params['gui_hint']
+    hint.set_value('tabs@1: row, 0')
+    flow_graph.rewrite()
+    assert not hint.get_error_messages()
+
+    rewritten = []
+    for block in flow_graph.blocks:
+        monkeypatch.setattr(block, 'rewrite', lambda block=block: (
+            rewritten.append(block.name), type(block).rewrite(block)))
+
+    tabs.states['coordinate'] = (100, 100)  # moved
+    flow_graph.rewrite()
+    assert rewritten == []
+
+    flow_graph.get_block('row').params['value'].set_value('-1')
+    flow_graph.rewrite()
+    assert sorted(rewritten) == ['row', 'widget']
+    assert 'non-negative integers only' in hint.get_error_messages()[0]
+
+    del rewritten[:]
+    tabs.params['num_tabs'].set_value('1')
+    flow_graph.rewrite()
+    assert sorted(rewritten) == ['tabs', 'widget']
+    assert 'Index out of range' in hint.get_error_messages()[0]
+
+
+def test_incremental_validate(platform, monkeypatch):
+    flow_graph = platform.make_flow_graph()
+    var_a = add_variable(flow_graph, 'a', '1')
+    var_b = add_variable(flow_graph, 'b', '1 +')
+    var_c = add_variable(flow_graph, 'c', '10')
+    flow_graph.rewrite()
+    flow_graph.validate()
+    errors = var_b.get_error_messages()
+    assert errors and var_a.is_valid() and var_c.is_valid()
+
+    validated = []
+    for block in flow_graph.blocks:
+        monkeypatch.setattr(block, 'validate', lambda block=block: (
+            validated.append(block.name), type(block).validate(block)))
+
+    flow_graph.validate()  # nothing changed
+    assert validated == []
+    assert var_b.get_error_messages() == errors
+
+    var_a.params['value'].set_value('2')
+    flow_graph.rewrite()
+    flow_graph.validate()
+    assert validated == ['a']
+    assert var_b.get_error_messages() == errors
+
+    var_c.params['id'].set_value('a')
+    flow_graph.rewrite()
+    flow_graph.validate()
+    assert 'ID "a" is not unique.' in var_c.params['id'].get_error_messages()
+    assert 'ID "a" is not unique.' in var_a.params['id'].get_error_messages()
+
+    # checks of other blocks are run again without a rewrite, without adding messages
+    del validated[:]
+    var_c.state = 'disabled'
+    flow_graph.validate()
+    flow_graph.validate()
+    assert validated == ['a']  # var_c, the changed block
+    assert not var_a.params['id'].get_error_messages()
+    assert var_b.get_error_messages() == errors
+
+
+def test_epy_block_reload_error(platform):
+    flow_graph = platform.make_flow_graph()
+    epy_block = flow_graph.new_block('epy_block')
+    epy_block.params['id'].set_value('epy_0')
+    epy_block.states['_io_cache'] = repr(
+        ('blk', 'blk', [], [('0', 'complex', 1)], [('0', 'complex', 1)], ''))
+    epy_block.params['_source_code'].set_value('def (:')  # fails to reload
+    source = flow_graph.new_block('pad_source')
+    flow_graph.rewrite()
+    flow_graph.validate()
+    param = epy_block.params['_source_code']
+    errors = param.get_error_messages()
+    assert errors
+
+    # port changes validate the block again, but not the param
+    flow_graph.connect(source.sources[0], epy_block.sinks[0])
+    flow_graph.validate()
+    flow_graph.disconnect(epy_block.sinks[0])
+    flow_graph.validate()
+    flow_graph.validate()
+    assert param.get_error_messages() == errors
+    assert errors.count(str(epy_block._epy_reload_error)) == 1
+
+
+def test_import_data(platform, monkeypatch):
+    flow_graph = platform.make_flow_graph()
+    add_variable(flow_graph, 'a', '1')
+    add_variable(flow_graph, 'b', 'a * 2')
+    flow_graph.rewrite()
+    data = flow_graph.export_data()
+
+    rewritten = []
+    variable_cls = platform.block_classes['variable']
+    rewrite = variable_cls.rewrite
+    monkeypatch.setattr(variable_cls, 'rewrite', lambda self: (
+        rewritten.append(self.name), rewrite(self)))
+
+    new_flow_graph = platform.make_flow_graph()
+    renew_namespace = new_flow_graph.renew_namespace
+    renewed = []
+    monkeypatch.setattr(new_flow_graph, 'renew_namespace', lambda: (
+        renewed.append(True), renew_namespace())[1])
+    new_flow_graph.import_data(data)
+    assert len(renewed) == 1
+    # none on import, twice in the first flow graph rewrite, the second one has nothing to do
+    assert sorted(rewritten) == ['a', 'a', 'b', 'b']
+    assert new_flow_graph.namespace['b'] == 2
+    assert new_flow_graph.export_data() == data
+
+
+def test_connection_index(platform):
+    flow_graph = platform.make_flow_graph()
+    source = flow_graph.new_block('pad_source')
+    sink_0 = flow_graph.new_block('pad_sink')
+    sink_1 = flow_graph.new_block('pad_sink')
+    flow_graph.rewrite()
+
+    port = source.sources[0]
+    con_0 = flow_graph.connect(port, sink_0.sinks[0])
+    con_1 = flow_graph.connect(port, sink_1.sinks[0])
+    assert set(port.connections()) == {con_0, con_1}
+    assert set(flow_graph.connections.of_block(sink_1)) == {con_1}
+    assert list(sink_1.sinks[0].connections(enabled=False)) == []
+
+    flow_graph.remove_element(sink_0)
+    assert set(flow_graph.connections) == {con_1}
+    assert list(port.connections()) == [con_1]
+    assert not flow_graph.connections.of_block(sink_0)
+
+    flow_graph.disconnect(port)
+    assert not flow_graph.connections and not flow_graph.connections.of_block(source)
+
+
+def test_block_name_index(platform):
+    flow_graph = platform.make_flow_graph()
+    var_a = add_variable(flow_graph, 'a', '1')
+    var_b = add_variable(flow_graph, 'b', '2')
+    assert flow_graph.get_block('a') is var_a
+    assert 'b' in flow_graph.get_block_names()
+
+    var_b.params['id'].set_value('a')
+    assert 'b' not in flow_graph.get_block_names()
+    assert flow_graph.count_enabled_blocks('a') == 2
+    var_b.state = 'disabled'
+    assert flow_graph.count_enabled_blocks('a') == 1
+
+    flow_graph.remove_element(var_a)
+    assert flow_graph.get_block('a') is var_b
+    flow_graph.remove_element(var_b)
+    with pytest.raises(KeyError):
+        flow_graph.get_block('a')
+    assert flow_graph.count_enabled_blocks('a') == 0
+
+
+def test_virtual_port_table(platform):
+    from grc.core.ports import _virtual_connections
+
+    flow_graph = platform.make_flow_graph()
+    source = flow_graph.new_block('pad_source')
+    sink = flow_graph.new_block('pad_sink')
+    virtual_sink = flow_graph.new_block('virtual_sink')
+    virtual_source = flow_graph.new_block('virtual_source')
+    for block in (virtual_sink, virtual_source):
+        block.params['stream_id'].set_value('x')
+    flow_graph.rewrite()
+    flow_graph.connect(source.sources[0], virtual_sink.sinks[0])
+    flow_graph.connect(virtual_source.sources[0], sink.sinks[0])
+    flow_graph.rewrite()
+    flow_graph.validate()
+
+    table = flow_graph.get_virtual_port_table()
+    assert table.sinks['x'] == [virtual_sink] and table.sources['x'] == [virtual_source]
+    assert virtual_source.sources[0].resolve_virtual_source() == [source.sources[0]]
+    assert _virtual_connections.downstream_ports(virtual_sink.sinks[0]) == [sink.sinks[0]]
+    assert virtual_source.sources[0].dtype == source.sources[0].dtype
+    assert flow_graph.get_virtual_port_table() is table
+
+    # a loop over the virtual connections
+    loop_sink = flow_graph.new_block('virtual_sink')
+    loop_source = flow_graph.new_block('virtual_source')
+    for block in (loop_sink, loop_source):
+        block.params['stream_id'].set_value('y')
+    flow_graph.rewrite()
+    flow_graph.connect(loop_source.sources[0], loop_sink.sinks[0])
+    assert flow_graph.get_virtual_port_table() is not table
+    with pytest.raises(_virtual_connections.LoopError):
+        _virtual_connections.upstream_ports(loop_source.sources[0])
+
+
+def test_rendered_templates(platform):
+    flow_graph = platform.make_flow_graph()
+    var_a = add_variable(flow_graph, 'a', '1')
+    flow_graph.rewrite()
+    assert var_a.templates.render('var_make') == 'self.a = a = 1'
+    assert var_a.templates.render('var_make') == 'self.a = a = 1'
+
+    var_a.params['value'].set_value('2')
+    assert var_a.templates.render('var_make') == 'self.a = a = 2'
+    var_a.params['id'].set_value('b')
+    assert var_a.templates.render('var_make') == 'self.b = b = 2'
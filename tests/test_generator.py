@@ -7,6 +7,7 @@
 
 import pytest
 
+import os
 from os import path
 import tempfile
 
@@ -37,3 +38,129 @@ def test_generator():
 
     generator = platform.Generator(flow_graph, path.join(path.dirname(__file__), 'resources'))
     generator.write()
+
+
+def test_render_stripped():
+    import io
+    from mako.template import Template
+    from grc.core.generator.writer import render_stripped
+
+    template = Template('a  \n% for i in range(3):\n${i} ${space}\n% endfor\n \t\nb${space}')
+    fp = io.StringIO()
+    render_stripped(template, fp, space='  ')
+    text = template.render(space='  ')
+    assert fp.getvalue() == '\n'.join(line.rstrip() for line in text.split('\n'))
+
+
+def test_atomic_output(tmp_path):
+    from grc.core.generator.writer import atomic_output
+
+    filename = str(tmp_path / 'out.py')
+    changed = []
+    with atomic_output(filename, 0o644, changed) as fp:
+        fp.write('old')
+    inode = os.stat(filename).st_ino
+    with atomic_output(filename, 0o600, changed) as fp:
+        fp.write('old')
+    assert changed == [filename]
+    assert os.stat(filename).st_ino == inode and os.stat(filename).st_mode & 0o777 == 0o600
+    with pytest.raises(ValueError):
+        with atomic_output(filename) as fp:
+            fp.write('new')
+            raise ValueError()
+    with open(filename) as fp:
+        assert fp.read() == 'old'
+    assert [f.name for f in tmp_path.iterdir()] == ['out.py']
+
+    os.chmod(filename, 0o751)
+    with atomic_output(filename, changed_files=changed) as fp:  # keeps the mode of the file
+        fp.write('new')
+    assert changed == [filename] * 2 and os.stat(filename).st_mode & 0o777 == 0o751
+
+
+def test_atomic_outputs(tmp_path):
+    from grc.core.generator.writer import atomic_outputs
+
+    first, second = str(tmp_path / 'first.py'), str(tmp_path / 'second.py')
+    with pytest.raises(ValueError):
+        with atomic_outputs() as output:
+            with output(first) as fp:
+                fp.write('first')
+            with output(second) as fp:
+                raise ValueError()
+    assert not list(tmp_path.iterdir())  # nothing replaced, no temporary files left
+
+    changed = []
+    with atomic_outputs(changed) as output:
+        for filename in (first, second):
+            with output(filename) as fp:
+                fp.write(filename)
+            assert not os.path.exists(filename)
+    assert changed == [first, second]
+
+
+def test_write_changed(tmp_path):
+    grc_file = path.join(path.dirname(__file__), 'resources', 'test_compiler.grc')
+    platform = Platform(
+        name='GNU Radio Companion Compiler',
+        prefs=None,
+        version='0.0.0',
+    )
+    platform.build_library([path.join(path.dirname(__file__), '../../grc/blocks')])
+    flow_graph = platform.make_flow_graph(grc_file)
+    flow_graph.rewrite()
+
+    generator = platform.Generator(flow_graph, str(tmp_path))
+    generator.write()
+    assert generator.changed_files == generator.output_files == [generator.file_path]
+    mtime = os.stat(generator.file_path).st_mtime_ns
+
+    generator = platform.Generator(flow_graph, str(tmp_path))
+    generator.write()
+    assert generator.changed_files == [] and generator.output_files == [generator.file_path]
+    assert os.stat(generator.file_path).st_mtime_ns == mtime
+
+
+def test_resolved_connections(monkeypatch):
+    from grc.core.generator.FlowGraphProxy import FlowGraphProxy
+
+    platform = Platform(
+        name='GNU Radio Companion Compiler',
+        prefs=None,
+        version='0.0.0',
+    )
+    platform.build_library([path.join(path.dirname(__file__), '../../grc/blocks')])
+    monkeypatch.setitem(platform.blocks, 'test_copy', platform.new_block_class(
+        id='test_copy', label='Copy', inputs=[{'domain': 'stream', 'dtype': 'float'}],
+        outputs=[{'domain': 'stream', 'dtype': 'float'}], templates={'make': 'copy()'}))
+
+    flow_graph = platform.make_flow_graph()
+    source = flow_graph.new_block('pad_source')
+    copy_0 = flow_graph.new_block('test_copy')
+    copy_1 = flow_graph.new_block('test_copy')
+    virtual_sink = flow_graph.new_block('virtual_sink')
+    virtual_source = flow_graph.new_block('virtual_source')
+    sinks = [flow_graph.new_block('pad_sink') for _ in range(3)]
+    for block in (virtual_sink, virtual_source):
+        block.params['stream_id'].set_value('x')
+    flow_graph.rewrite()
+
+    flow_graph.connect(source.sources[0], copy_0.sinks[0])
+    flow_graph.connect(copy_0.sources[0], copy_1.sinks[0])
+    for sink in sinks[:2]:
+        flow_graph.connect(copy_1.sources[0], sink.sinks[0])
+    flow_graph.connect(copy_1.sources[0], virtual_sink.sinks[0])
+    flow_graph.connect(virtual_source.sources[0], sinks[2].sinks[0])
+    copy_0.state = copy_1.state = 'bypassed'
+    flow_graph.rewrite()
+
+    def resolved_connections():
+        connections = FlowGraphProxy(flow_graph).get_resolved_connections()
+        blocks = [(c.source_block, c.sink_block) for c in connections]
+        assert len(set(blocks)) == len(blocks)
+        return set(blocks)
+
+    assert resolved_connections() == {(source, sink) for sink in sinks}
+
+    copy_1.state = 'enabled'
+    assert resolved_connections() == {(source, copy_1)} | {(copy_1, sink) for sink in sinks}
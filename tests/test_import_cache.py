@@ -0,0 +1,36 @@
+# Copyright 2021 Free Software Foundation, Inc.
+#
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import pytest
+
+from grc.core.utils import import_cache
+
+
+def test_exec_imports(monkeypatch):
+    monkeypatch.setattr(import_cache, '_cache', {})
+
+    namespace = {'x': 1}
+    import_cache.exec_imports('import os\nfrom os import path as p', namespace)
+    assert namespace['p'] is namespace['os'].path and namespace['x'] == 1
+    assert '__builtins__' not in namespace
+
+    import_cache._cache['import os\nfrom os import path as p'][0]['marker'] = True
+    namespace = {}
+    import_cache.exec_imports('import os\nfrom os import path as p', namespace)
+    assert namespace['marker']  # not run again
+
+    for _ in range(2):
+        namespace = {}
+        with pytest.raises(ImportError):
+            import_cache.exec_imports('import os\nimport no_such_module_0', namespace)
+        assert 'os' in namespace
+    assert len(import_cache._cache) == 2
+
+    import_cache.clear(failures_only=True)
+    assert list(import_cache._cache) == ['import os\nfrom os import path as p']
+    import_cache.clear()
+    assert not import_cache._cache
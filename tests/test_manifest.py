@@ -0,0 +1,96 @@
+# Copyright 2021 Free Software Foundation, Inc.
+#
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+from os import path
+
+from grc.core import Constants, Messages
+from grc.core.manifest import BuildManifest
+from grc.core.platform import Platform
+
+GRC_FILE = path.join(path.dirname(__file__), 'resources', 'test_compiler.grc')
+BLOCK_PATHS = [path.join(path.dirname(__file__), '../../grc/blocks')]
+
+
+def test_manifest(tmp_path, cache_file):
+    platform = Platform(
+        name='GNU Radio Companion Compiler',
+        prefs=None,
+        version='0.0.0',
+        headless=True,
+    )
+    platform.build_library(BLOCK_PATHS)
+    out_dir = str(tmp_path)
+
+    def generate():
+        manifest = BuildManifest(Constants.BUILD_MANIFEST_FILE, '0.0.0')
+        manifest.load()
+        flow_graph, file_path = platform.load_and_generate_flow_graph(
+            GRC_FILE, out_dir, manifest=manifest)
+        manifest.save()
+        return flow_graph, file_path
+
+    flow_graph, file_path = generate()
+    assert flow_graph and path.isfile(file_path)
+    mtime = os.stat(file_path).st_mtime_ns
+
+    # unchanged
+    assert generate() == (None, file_path)
+    assert os.stat(file_path).st_mtime_ns == mtime
+
+    # modified output
+    with open(file_path, 'a') as fp:
+        fp.write('\n')
+    flow_graph, _ = generate()
+    assert flow_graph and flow_graph.generated_files == {file_path: True}
+
+    # modified connection template of a domain
+    assert generate()[0] is None
+    platform.connection_templates['stream', 'stream'] += '  # changed'
+    platform._generator_inputs = None
+    assert generate()[0]
+
+
+def test_generated_files_report(tmp_path, cache_file, monkeypatch):
+    platform = Platform(
+        name='GNU Radio Companion Compiler',
+        prefs=None,
+        version='0.0.0',
+        headless=True,
+    )
+    platform.build_library(BLOCK_PATHS)
+    messages = []
+    monkeypatch.setattr(Messages, 'MESSENGERS_LIST', [messages.append])
+
+    flow_graph, file_path = platform.load_and_generate_flow_graph(GRC_FILE, str(tmp_path))
+    assert flow_graph.generated_files == {file_path: True}
+    assert '    Changed:   {}\n'.format(file_path) in messages
+
+    flow_graph, _ = platform.load_and_generate_flow_graph(GRC_FILE, str(tmp_path))
+    assert flow_graph.generated_files == {file_path: False}
+    assert '    Unchanged: {}\n'.format(file_path) in messages
+
+
+def test_manifest_concurrent_save(cache_file):
+    manifest_a = BuildManifest(Constants.BUILD_MANIFEST_FILE, '0.0.0')
+    manifest_b = BuildManifest(Constants.BUILD_MANIFEST_FILE, '0.0.0')
+    manifest_a.set_entry('a.grc', None, {'file_path': 'a.py'})
+    manifest_a.set_entry('c.grc', None, {'file_path': 'c.py'})
+    manifest_a.save()
+    manifest_b.load()
+    manifest_b.discard('c.grc', None)
+
+    manifest_a.set_entry('a.grc', None, {'file_path': 'a2.py'})
+    manifest_a.save()
+    manifest_b.set_entry('b.grc', None, {'file_path': 'b.py'})
+    manifest_b.save()  # keeps the entries saved by manifest_a meanwhile
+
+    manifest = BuildManifest(Constants.BUILD_MANIFEST_FILE, '0.0.0')
+    manifest.load()
+    assert manifest.get_entry('a.grc', None) == {'file_path': 'a2.py'}
+    assert manifest.get_entry('b.grc', None) == {'file_path': 'b.py'}
+    assert manifest.get_entry('c.grc', None) is None
@@ -0,0 +1,181 @@
+# Copyright 2021 Free Software Foundation, Inc.
+#
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+from os import path
+
+import pytest
+
+from grc.core import Constants, Messages, utils
+from grc.core.blocks import LazyBlockRegistry
+from grc.core.cache import Cache
+from grc.core.generator import top_block
+from grc.core.platform import Platform
+
+BLOCK_PATHS = [path.join(path.dirname(__file__), '../../grc/blocks')]
+
+
+def make_platform():
+    return Platform(
+        name='GNU Radio Companion Compiler',
+        prefs=None,
+        version='0.0.0',
+    )
+
+
+def library_state(platform):
+    return (
+        {key: (block.loaded_from, block.label, block.category, block.flags.data,
+               block.documentation[''], block.parameters_data, block.inputs_data,
+               block.outputs_data, dict(block.templates), dict(block.cpp_templates))
+         for key, block in platform.blocks.maps[0].items()},
+        dict(platform.domains),
+        dict(platform.connection_templates),
+    )
+
+
+def test_parallel_build_library(cache_file):
+    platform = make_platform()
+    platform.build_library(BLOCK_PATHS, processes=2)
+    parallel = library_state(platform)
+
+    # warm cache, serial loading
+    os.remove(Constants.LIBRARY_SNAPSHOT_FILE)
+    platform = make_platform()
+    platform.build_library(BLOCK_PATHS)
+    assert library_state(platform) == parallel
+
+
+def test_library_snapshot(cache_file, monkeypatch):
+    platform = make_platform()
+    platform.build_library(BLOCK_PATHS)
+    built = library_state(platform)
+
+    def fail(*args, **kwargs):
+        raise AssertionError('block built despite snapshot')
+
+    monkeypatch.setattr(Platform, 'new_block_class', fail)
+    platform = make_platform()
+    platform.build_library(BLOCK_PATHS)
+    assert library_state(platform) == built
+    assert platform.blocks['variable'].flags.not_dsp
+
+
+@pytest.mark.parametrize('snapshot', [False, True])
+def test_lazy_blocks(cache_file, snapshot):
+    platform = make_platform()
+    platform.build_library(BLOCK_PATHS)
+    built = library_state(platform)
+    if not snapshot:
+        os.remove(Constants.LIBRARY_SNAPSHOT_FILE)
+
+    platform = Platform(name='GNU Radio Companion Compiler', prefs=None,
+                        version='0.0.0', lazy_blocks=True)
+    platform.build_library(BLOCK_PATHS)
+    registry = platform.blocks.maps[0]
+    assert set(registry) == set(built[0])
+    assert not isinstance(registry.peek('variable'), type)
+    assert registry.peek('variable').category == built[0]['variable'][2]
+    assert isinstance(registry.peek('options'), type)  # cleaned up after loading
+
+    assert library_state(platform) == built
+    assert isinstance(registry.peek('variable'), type)
+
+
+def test_lazy_blocks_cache_opened_once(cache_file, monkeypatch):
+    platform = make_platform()
+    platform.build_library(BLOCK_PATHS)
+    os.remove(Constants.LIBRARY_SNAPSHOT_FILE)
+
+    loads = []
+    load = Cache.load
+    monkeypatch.setattr(Cache, 'load', lambda self: (loads.append(self), load(self)))
+    platform = Platform(name='GNU Radio Companion Compiler', prefs=None,
+                        version='0.0.0', lazy_blocks=True)
+    platform.build_library(BLOCK_PATHS)
+    assert len(loads) == 2  # loading the descriptions, building "options"
+    for key in ('variable', 'note', 'import', 'pad_source'):
+        assert isinstance(platform.blocks[key], type)
+    assert len(loads) == 2
+    assert not os.path.exists(Constants.LIBRARY_SNAPSHOT_FILE)  # lazy loads don't save one
+
+
+def test_headless(cache_file):
+    platform = Platform(name='GNU Radio Companion Compiler', prefs=None,
+                        version='0.0.0', headless=True)
+    platform.build_library(BLOCK_PATHS)
+    assert platform._docstring_extractor is None
+    assert isinstance(platform.blocks.maps[0], LazyBlockRegistry)
+    assert platform.blocks['variable'].documentation.keys() == {''}
+
+
+def test_precompile_lazy_blocks(cache_file):
+    platform = Platform(name='GNU Radio Companion Compiler', prefs=None,
+                        version='0.0.0', headless=True)
+    platform.build_library(BLOCK_PATHS)
+    module_dir = Constants.TEMPLATE_MODULE_DIR
+    assert not os.path.exists(module_dir)  # not precompiled when built
+
+    registry = platform.blocks.maps[0]
+    top_block.get_template.cache_clear()  # compiled by other tests
+    platform.precompile_templates(['variable', 'no_such_block'])
+    assert isinstance(registry.peek('variable'), type)
+    assert not isinstance(registry.peek('note'), type)
+    compiled = {name for _, _, files in os.walk(module_dir) for name in files}
+    assert 'flow_graph.py.mako.py' in compiled
+    uri = utils.template_cache._get_uri(
+        platform.blocks['variable'].templates['var_make'], {'strict_undefined': True})
+    assert os.path.basename(uri) + '.py' in compiled
+
+
+def write_flow_graph(directory, name, block_ids, generate_options='hb'):
+    blocks = '\n'.join(
+        '- {{name: {0}_0, id: {0}, parameters: {{}}, '
+        'states: {{coordinate: [0, 0], rotation: 0, state: enabled}}}}'.format(block_id)
+        for block_id in block_ids)
+    with open(os.path.join(directory, name + '.grc'), 'w') as fp:
+        fp.write(
+            'options:\n'
+            '  parameters: {{id: {}, generate_options: {}}}\n'
+            '  states: {{coordinate: [0, 0], rotation: 0, state: enabled}}\n'
+            'blocks:{}\n{}\n'
+            'connections: []\n'
+            'metadata: {{file_format: 1}}\n'.format(
+                name, generate_options, '' if blocks else ' []', blocks))
+    return os.path.join(directory, name + '.grc')
+
+
+def test_hier_block_build_order(cache_file, tmp_path, monkeypatch):
+    platform = make_platform()
+    platform.build_library(BLOCK_PATHS)
+
+    top = write_flow_graph(str(tmp_path), 'top', ['a', 'b', 'variable'])
+    a = write_flow_graph(str(tmp_path), 'a', ['c'])
+    b = write_flow_graph(str(tmp_path), 'b', ['c', 'd'])
+    c = write_flow_graph(str(tmp_path), 'c', [], generate_options='no_gui')
+
+    assert platform.hier_block_build_order([top]) == [[c], [a, b]]
+
+    messages = []
+    monkeypatch.setattr(Messages, 'MESSENGERS_LIST', [messages.append])
+    platform.generated_hier_blocks = {}
+    for _ in range(2):  # failures are tried again
+        del messages[:]
+        assert platform.load_and_generate_flow_graph(c, hier_only=True) == (None, None)
+        assert any('Not a hier block' in message for message in messages)
+    assert not platform.generated_hier_blocks
+
+    # only loaded once per run
+    d = write_flow_graph(str(tmp_path), 'd', [])
+    flow_graph, file_path = platform.load_and_generate_flow_graph(d, str(tmp_path), hier_only=True)
+    assert flow_graph and file_path
+    del messages[:]
+    assert platform.load_and_generate_flow_graph(d, str(tmp_path), hier_only=True) == (None, file_path)
+    assert not messages
+
+    platform.build_library(BLOCK_PATHS)
+    assert platform.generated_hier_blocks == {}
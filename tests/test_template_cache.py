@@ -0,0 +1,58 @@
+# Copyright 2021 Free Software Foundation, Inc.
+#
+# This file is part of GNU Radio
+#
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+
+import os
+
+import mako.template
+import pytest
+from mako.exceptions import SyntaxException
+
+from grc.core import Constants
+from grc.core.utils import template_cache
+
+
+@pytest.fixture
+def module_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(Constants, 'TEMPLATE_MODULE_DIR', str(tmp_path / 'mako'))
+    return template_cache.module_directory()
+
+
+def test_from_text(module_dir, monkeypatch):
+    text = 'abc${num} µ'
+    template = template_cache.from_text(text, strict_undefined=True)
+    assert template.render(num=1) == 'abc1 µ'
+    assert sorted(os.listdir(os.path.join(module_dir, 'text'))) == [
+        os.path.basename(template.filename), os.path.basename(template.filename) + '.py']
+
+    def fail(*args, **kwargs):
+        raise AssertionError('template compiled again')
+
+    monkeypatch.setattr(mako.template, '_compile_module_file', fail)
+    template = template_cache.from_text(text, strict_undefined=True)
+    assert template.render(num=2) == 'abc2 µ'
+    with pytest.raises(NameError):
+        template.render()  # strict_undefined
+
+
+def test_from_file(module_dir, tmp_path):
+    filename = str(tmp_path / 'test.mako')
+    with open(filename, 'w') as fp:
+        fp.write('${x}')
+    assert template_cache.from_file(filename).render(x=3) == '3'
+    assert os.listdir(module_dir)
+
+
+def test_precompile(module_dir):
+    template_cache.precompile(['${a}', '${b', '${c}'])
+    assert len(os.listdir(os.path.join(module_dir, 'text'))) == 3 + 2  # invalid one not compiled
+    with pytest.raises(SyntaxException):
+        template_cache.from_text('${b')
+
+
+def test_read_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(Constants, 'TEMPLATE_MODULE_DIR', os.devnull)
+    assert template_cache.from_text('${a}').render(a=1) == '1'